@@ -0,0 +1,131 @@
+"""
+Farmer analytics.
+
+FarmerDailyStats holds one row per farmer and day with the lines placed,
+delivered and cancelled that day and the matching revenue. It is updated
+in the same transaction as the order change, by place_order,
+order_status and auto_deliver, so historical totals are a SUM over a
+farmer's day rows instead of a scan of their whole FarmerOrder history.
+Live figures (lines still open) come from one conditional aggregate over
+the farmer's open lines. rebuild() recomputes the table from FarmerOrder,
+e.g. after a bulk import.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import FarmerDailyStats, FarmerOrder
+
+OPEN_STATUSES = ('Pending', 'Shipped', 'Out for Delivery')
+# Line status -> (line counter, revenue counter) it adds to
+STATUS_FIELDS = {
+    'Delivered': ('lines_delivered', 'revenue_delivered'),
+    'Cancelled': ('lines_cancelled', None),
+}
+STAT_FIELDS = ('lines_placed', 'revenue_placed', 'lines_delivered', 'revenue_delivered', 'lines_cancelled')
+
+
+@transaction.atomic
+def record(deltas, day=None):
+    """Add {farmer_id: {field: amount}} to the farmers' rows for `day` (today)."""
+    deltas = {farmer_id: fields for farmer_id, fields in deltas.items() if any(fields.values())}
+    if not deltas:
+        return
+    day = day or timezone.localdate()
+    FarmerDailyStats.objects.bulk_create(
+        [FarmerDailyStats(farmer_id=farmer_id, day=day) for farmer_id in deltas],
+        ignore_conflicts=True,
+    )
+    for farmer_id, fields in deltas.items():
+        FarmerDailyStats.objects.filter(farmer_id=farmer_id, day=day).update(
+            **{field: F(field) + amount for field, amount in fields.items()}
+        )
+
+
+def lines_placed(lines):
+    """lines: iterable of (farmer_id, line total)."""
+    deltas = defaultdict(lambda: {'lines_placed': 0, 'revenue_placed': Decimal('0')})
+    for farmer_id, amount in lines:
+        deltas[farmer_id]['lines_placed'] += 1
+        deltas[farmer_id]['revenue_placed'] += amount
+    record(deltas)
+
+
+def lines_moved(lines, status):
+    """Lines that just reached `status`; lines: iterable of (farmer_id, line total)."""
+    if status not in STATUS_FIELDS:
+        return
+    count_field, revenue_field = STATUS_FIELDS[status]
+    deltas = defaultdict(lambda: defaultdict(int))
+    for farmer_id, amount in lines:
+        deltas[farmer_id][count_field] += 1
+        if revenue_field:
+            deltas[farmer_id][revenue_field] += amount
+    record(deltas)
+
+
+def line_total():
+    """Value of a FarmerOrder's line, for annotate()/aggregate() on FarmerOrder."""
+    return ExpressionWrapper(
+        F('order_item__price') * F('order_item__quantity'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def dashboard(farmer, recent_days=30):
+    """All dashboard figures in two queries, neither scanning order history."""
+    live = FarmerOrder.objects.filter(farmer=farmer, status__in=OPEN_STATUSES).aggregate(
+        open=Count('id'),
+        pending=Count('id', filter=Q(status='Pending')),
+        shipped=Count('id', filter=Q(status='Shipped')),
+        out_for_delivery=Count('id', filter=Q(status='Out for Delivery')),
+    )
+    since = timezone.localdate() - timedelta(days=recent_days - 1)
+    money = DecimalField(max_digits=14, decimal_places=2)
+    history = FarmerDailyStats.objects.filter(farmer=farmer).aggregate(
+        total_orders=Coalesce(Sum('lines_placed'), 0),
+        delivered_orders=Coalesce(Sum('lines_delivered'), 0),
+        cancelled_orders=Coalesce(Sum('lines_cancelled'), 0),
+        total_earnings=Coalesce(Sum('revenue_delivered'), Decimal('0'), output_field=money),
+        recent_orders=Coalesce(Sum('lines_placed', filter=Q(day__gte=since)), 0),
+        recent_earnings=Coalesce(Sum('revenue_delivered', filter=Q(day__gte=since)), Decimal('0'), output_field=money),
+    )
+    return {**live, **history, 'recent_days': recent_days}
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Recompute every row from FarmerOrder. Placed lines count on their
+    created_at day; delivered and cancelled ones on their updated_at day,
+    the best record of when they got there. Returns the number of rows.
+    """
+    rows = defaultdict(dict)
+    total = line_total()
+    placed = (
+        FarmerOrder.objects.annotate(day=TruncDate('created_at'))
+        .values('farmer_id', 'day').annotate(n=Count('id'), revenue=Sum(total))
+    )
+    for row in placed:
+        rows[row['farmer_id'], row['day']].update(lines_placed=row['n'], revenue_placed=row['revenue'])
+    for status, (count_field, revenue_field) in STATUS_FIELDS.items():
+        moved = (
+            FarmerOrder.objects.filter(status=status).annotate(day=TruncDate('updated_at'))
+            .values('farmer_id', 'day').annotate(n=Count('id'), revenue=Sum(total))
+        )
+        for row in moved:
+            rows[row['farmer_id'], row['day']][count_field] = row['n']
+            if revenue_field:
+                rows[row['farmer_id'], row['day']][revenue_field] = row['revenue']
+
+    FarmerDailyStats.objects.all().delete()
+    FarmerDailyStats.objects.bulk_create(
+        [FarmerDailyStats(farmer_id=farmer_id, day=day, **fields) for (farmer_id, day), fields in rows.items()],
+        batch_size=500,
+    )
+    return len(rows)
@@ -2,20 +2,10 @@ from django.apps import AppConfig
 
 
 class HomeConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'home'
-
-
-class YourAppConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'your_app_name'
-
-    def ready(self):
-        import your_app_name.signals
-
-class HomeConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
+    # Existing tables were migrated with AutoField primary keys (0005).
+    default_auto_field = 'django.db.models.AutoField'
     name = 'home'
 
     def ready(self):
         import home.signals
+        import home.tasks  # registers background job handlers
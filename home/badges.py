@@ -0,0 +1,75 @@
+"""
+Badge counters for the navbar: unread notifications (per user) and cart
+items (per session, like the cart itself).
+
+Both live in the cache and are kept up to date by the code that changes
+them (home.notifications drops the counter on insert, the notification
+pages zero it on mark-as-read, the cart views rewrite theirs on every
+session cart write), so the context processor in
+home/context_processors.py renders them from one cache read. A missing
+unread counter is recounted against the read watermark; a missing cart
+counter is rebuilt from the session, which is already loaded for
+request.user.
+"""
+from django.core.cache import cache
+
+BADGE_TIMEOUT = 24 * 60 * 60   # bounds drift if an update is ever missed
+
+
+def unread_key(user_id):
+    return f'badge:unread:{user_id}'
+
+
+def cart_key(session_key):
+    # The cart lives in the session, so its counter does too
+    return f'badge:cart:{session_key}'
+
+
+def count_unread(user_id):
+    from .notifications import unread
+
+    count = unread(user_id).count()
+    cache.set(unread_key(user_id), count, BADGE_TIMEOUT)
+    return count
+
+
+def unread_count(user_id):
+    count = cache.get(unread_key(user_id))
+    return count_unread(user_id) if count is None else count
+
+
+def notifications_added(counts):
+    """counts: {user_id: new unread notifications}."""
+    # Dropped rather than incr()'d: the file cache's incr() is a read and a
+    # write, so concurrent inserts could lose counts. The next read recounts.
+    cache.delete_many([unread_key(user_id) for user_id in counts])
+
+
+def notifications_read(user_id):
+    cache.set(unread_key(user_id), 0, BADGE_TIMEOUT)
+
+
+def cart_items(cart):
+    return sum(int(qty) for qty in cart.values())
+
+
+def cart_changed(request, cart):
+    """Store the session cart (None empties it) and its badge counter; use for every cart write."""
+    if cart is None:
+        request.session.pop('cart', None)
+    else:
+        request.session['cart'] = cart
+    cache.set(cart_key(request.session.session_key), cart_items(cart or {}), BADGE_TIMEOUT)
+
+
+def badges(request):
+    keys = unread_key(request.user.id), cart_key(request.session.session_key)
+    cached = cache.get_many(keys)
+    unread = cached.get(keys[0])
+    if unread is None:
+        unread = count_unread(request.user.id)
+    cart = cached.get(keys[1])
+    if cart is None:
+        cart = cart_items(request.session.get('cart', {}))
+        cache.set(keys[1], cart, BADGE_TIMEOUT)
+    return {'unread_notifications': unread, 'cart_count': cart}
@@ -0,0 +1,73 @@
+"""
+Cart pricing shared by viewcartfn, checkoutfn and placeorderfn.
+
+A session cart is a {product_id: quantity} dict; price_cart() turns it into a
+PricedCart with a single in_bulk() query, however many lines it has.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from .models import Product
+
+FREE_DELIVERY_THRESHOLD = Decimal('500')
+DELIVERY_CHARGE = Decimal('50')
+
+
+def delivery_charge(subtotal):
+    """Free for empty carts and orders of ₹500 or more, otherwise ₹50."""
+    if subtotal == 0 or subtotal >= FREE_DELIVERY_THRESHOLD:
+        return Decimal('0')
+    return DELIVERY_CHARGE
+
+
+@dataclass
+class PricedLine:
+    product: Product
+    quantity: int
+    total: Decimal
+
+
+@dataclass
+class PricedCart:
+    lines: list = field(default_factory=list)
+    missing: list = field(default_factory=list)   # product ids no longer in the catalog
+    subtotal: Decimal = Decimal('0')
+
+    @property
+    def delivery(self):
+        return delivery_charge(self.subtotal)
+
+    @property
+    def grand_total(self):
+        return self.subtotal + self.delivery
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def products(self):
+        return [line.product for line in self.lines]
+
+
+def price_cart(source):
+    """Price a {product_id: quantity} mapping; quantities <= 0 are dropped."""
+    quantities = {}
+    for pid, qty in source.items():
+        try:
+            pid, qty = int(pid), int(qty)
+        except (TypeError, ValueError):
+            continue
+        if qty > 0:
+            quantities[pid] = qty
+
+    products = Product.objects.in_bulk(list(quantities))
+
+    cart = PricedCart()
+    for pid, qty in quantities.items():
+        product = products.get(pid)
+        if product is None:
+            cart.missing.append(pid)
+            continue
+        total = product.price * qty
+        cart.lines.append(PricedLine(product=product, quantity=qty, total=total))
+        cart.subtotal += total
+    return cart
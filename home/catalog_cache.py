@@ -0,0 +1,142 @@
+"""
+Versioned cache for catalog listings.
+
+Every cached listing is stored under a key that embeds the generation counter
+of the scope it depends on ('all' for the whole catalog, 'cat:<id>' for one
+category). Product/Category signals bump the counters, which makes the old
+keys unreachable; nothing is ever deleted explicitly.
+
+A miss is recomputed by the one request that takes the rebuild lock, while
+everyone else is served the previous version or waits briefly for it. The
+file cache has no atomic add(), so the lock is a file created with
+O_CREAT | O_EXCL in settings.CATALOG_LOCK_DIR, next to the cache and on the
+same host as every worker; a lock left by a crashed worker is broken after
+LOCK_TIMEOUT. Bumps do not depend on atomic incr() either.
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+LISTING_TIMEOUT = 5 * 60      # bounds staleness of fields updated without save() (ratings)
+HOME_FEED_TIMEOUT = 60
+LOCK_TIMEOUT = 30
+WAIT_STEP = 0.05
+WAIT_TOTAL = 2.0
+
+ALL = 'all'
+
+
+def category_scope(category_id):
+    return f'cat:{category_id}' if category_id else ALL
+
+
+def generation(scope):
+    # Seeded from the clock so an evicted counter never restarts at a number
+    # whose listings are still in the cache.
+    return cache.get_or_set(f'catalog:gen:{scope}', time.time_ns, None)
+
+
+def bump(*scopes):
+    # A fresh clock value rather than incr(): two concurrent bumps both move
+    # the generation, where a non-atomic incr() could lose one of them.
+    cache.set_many({f'catalog:gen:{scope}': time.time_ns() for scope in set(scopes)}, None)
+
+
+def cached(name, scope, compute, timeout=LISTING_TIMEOUT):
+    """Return compute() cached under `name` for the current generation of `scope`."""
+    digest = hashlib.md5(name.encode()).hexdigest()
+    key = f'catalog:{scope}:{generation(scope)}:{digest}'
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    stale_key = f'catalog:{scope}:stale:{digest}'
+    lock = _acquire(key)
+    if lock:
+        try:
+            # The previous holder may have finished between our miss and the lock
+            value = cache.get(key)
+            if value is None:
+                value = compute()
+                cache.set_many({key: value, stale_key: value}, timeout)
+        finally:
+            _release(lock)
+        return value
+
+    # Someone else is rebuilding this key
+    value = cache.get(stale_key)
+    if value is not None:
+        return value
+    waited = 0.0
+    while waited < WAIT_TOTAL:
+        time.sleep(WAIT_STEP)
+        waited += WAIT_STEP
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return compute()
+
+
+def _lock_path(key):
+    lock_dir = getattr(settings, 'CATALOG_LOCK_DIR', None) or os.path.join(tempfile.gettempdir(), 'ofv_cache_locks')
+    os.makedirs(lock_dir, exist_ok=True)
+    return os.path.join(lock_dir, hashlib.md5(key.encode()).hexdigest())
+
+
+def _acquire(key):
+    """The lock file's path if this process now holds the rebuild lock for `key`, else None."""
+    path = _lock_path(key)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return path
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) < LOCK_TIMEOUT:
+                    return None
+                os.remove(path)  # its holder died mid-rebuild; try once more
+            except FileNotFoundError:
+                pass  # released meanwhile; the retry takes it if nobody else did
+    return None
+
+
+def _release(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# -----------------------------
+# Home page feed
+# -----------------------------
+HOME_FEATURED = 8
+HOME_FRESH = 8
+HOME_CATEGORIES = 12
+
+
+def build_home_feed():
+    from django.db.models import F, FloatField
+    from django.db.models.functions import Cast
+
+    from .models import Category, Product
+
+    featured = (
+        Product.objects.filter(rating_count__gt=0)
+        .annotate(avg_rating=Cast(F('rating_sum'), FloatField()) / F('rating_count'))
+        .order_by('-avg_rating', '-rating_count', '-id')[:HOME_FEATURED]
+    )
+    return {
+        'featured_products': list(featured),
+        'fresh_products': list(Product.objects.order_by('-created_at', '-id')[:HOME_FRESH]),
+        'categories': list(Category.objects.order_by('name')[:HOME_CATEGORIES]),
+    }
+
+
+def home_feed():
+    """Bounded home page data, rebuilt on any catalog change or every minute."""
+    return cached('home_feed', ALL, build_home_feed, timeout=HOME_FEED_TIMEOUT)
@@ -0,0 +1,8 @@
+from .badges import badges as badge_counts
+
+
+def badges(request):
+    """Navbar badges; reads only the cache once warm (home/badges.py)."""
+    if not request.user.is_authenticated:
+        return {}
+    return badge_counts(request)
@@ -0,0 +1,89 @@
+"""
+Sidebar facets for the product listing.
+
+All three facets (category, unit, price range) come from one GROUP BY over
+(category, unit, price bucket). Each facet is then folded in Python while
+ignoring its own filter, so selecting a category still shows how many
+products the other categories have.
+"""
+from django.db.models import Case, CharField, Count, Q, Value, When
+
+from .models import Product
+
+PRICE_BUCKETS = [
+    ('0-50', 'Under ₹50', 0, 50),
+    ('50-100', '₹50 – ₹100', 50, 100),
+    ('100-250', '₹100 – ₹250', 100, 250),
+    ('250-500', '₹250 – ₹500', 250, 500),
+    ('500+', '₹500 & above', 500, None),
+]
+PRICE_BUCKET_KEYS = {key for key, _, _, _ in PRICE_BUCKETS}
+
+
+def price_bucket_q(key):
+    for bucket, _, low, high in PRICE_BUCKETS:
+        if bucket == key:
+            q = Q(price__gte=low)
+            if high is not None:
+                q &= Q(price__lt=high)
+            return q
+    return Q()
+
+
+def _bucket_expression():
+    return Case(
+        *[When(price_bucket_q(key), then=Value(key)) for key, _, _, _ in PRICE_BUCKETS],
+        output_field=CharField(),
+    )
+
+
+def apply_filters(products, category=None, unit=None, price=None):
+    if category:
+        products = products.filter(ctgry_id=category)
+    if unit:
+        products = products.filter(unit=unit)
+    if price in PRICE_BUCKET_KEYS:
+        products = products.filter(price_bucket_q(price))
+    return products
+
+
+def compute_facets(products, categories, category=None, unit=None, price=None):
+    """
+    `products` is the listing queryset before the category/unit/price filters
+    (search and owner restrictions already applied); `categories` is the list
+    of Category objects shown in the sidebar.
+    """
+    rows = (
+        products.order_by()
+        .annotate(price_bucket=_bucket_expression())
+        .values('ctgry_id', 'unit', 'price_bucket')
+        .annotate(n=Count('id'))
+    )
+
+    category = str(category) if category else None
+    price = price if price in PRICE_BUCKET_KEYS else None
+    by_category, by_unit, by_price = {}, {}, {}
+    for row in rows:
+        in_category = category is None or str(row['ctgry_id']) == category
+        in_unit = unit is None or row['unit'] == unit
+        in_price = price is None or row['price_bucket'] == price
+        if in_unit and in_price:
+            by_category[row['ctgry_id']] = by_category.get(row['ctgry_id'], 0) + row['n']
+        if in_category and in_price:
+            by_unit[row['unit']] = by_unit.get(row['unit'], 0) + row['n']
+        if in_category and in_unit:
+            by_price[row['price_bucket']] = by_price.get(row['price_bucket'], 0) + row['n']
+
+    return {
+        'categories': [
+            {'id': c.id, 'name': c.name, 'count': by_category.get(c.id, 0)} for c in categories
+        ],
+        'units': [
+            {'value': value, 'label': label, 'count': by_unit.get(value, 0)}
+            for value, label in Product.UNIT_CHOICES if by_unit.get(value)
+        ],
+        'prices': [
+            {'value': key, 'label': label, 'count': by_price.get(key, 0)}
+            for key, label, _, _ in PRICE_BUCKETS
+        ],
+    }
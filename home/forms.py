@@ -1,11 +1,23 @@
 from django import forms
+from django.core.validators import FileExtensionValidator
 from .models import Product, UserProfile,Address
 
 
 class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
-        fields = ['name', 'price', 'details', 'image', 'ctgry']
+        fields = ['name', 'price', 'details', 'image', 'ctgry', 'unit', 'stock', 'low_stock_threshold']
+
+
+class ProductImportForm(ProductForm):
+    """One CSV row of a bulk import (home/product_import.py); the category is resolved by the importer."""
+    class Meta(ProductForm.Meta):
+        fields = ['name', 'price', 'details', 'image', 'unit', 'stock', 'low_stock_threshold']
+
+
+class ProductImportUploadForm(forms.Form):
+    csv_file = forms.FileField(label="Products CSV", validators=[FileExtensionValidator(['csv'])])
+    images = forms.FileField(label="Images zip", required=False, validators=[FileExtensionValidator(['zip'])])
 
 
 class UserProfileForm(forms.ModelForm):
@@ -0,0 +1,63 @@
+"""
+Resized WebP/JPEG derivatives of uploaded images.
+
+Derivatives live under MEDIA_ROOT/derivatives/ with names computed from the
+original file name, so templates can build srcset URLs without a DB lookup
+(see templatetags/image_tags.py).
+"""
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+WIDTHS = (200, 400, 800)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DERIVATIVE_ROOT = 'derivatives'
+# What build_derivatives() raises for an upload no retry can fix: missing or
+# corrupt files (OSError) and images over Pillow's pixel limit, which are
+# not an OSError
+UNREADABLE = (OSError, Image.DecompressionBombError)
+
+
+def derivative_name(name, width, ext):
+    stem = posixpath.splitext(name)[0]
+    return f'{DERIVATIVE_ROOT}/{stem}_{width}.{ext}'
+
+
+def has_derivatives(name, storage=default_storage):
+    return storage.exists(derivative_name(name, WIDTHS[0], 'jpg'))
+
+
+def build_derivatives(fieldfile, force=False):
+    """Write every width/format for an ImageField file; returns files written."""
+    if not fieldfile or not fieldfile.name:
+        return 0
+    storage = fieldfile.storage
+    if not force and has_derivatives(fieldfile.name, storage):
+        return 0
+
+    with fieldfile.open('rb') as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+
+    written = 0
+    for width in WIDTHS:
+        resized = original.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)  # never upscales
+        for ext, (fmt, options) in FORMATS.items():
+            image = resized
+            if fmt == 'JPEG' and image.mode != 'RGB':
+                image = image.convert('RGB')
+            buffer = BytesIO()
+            image.save(buffer, fmt, **options)
+            name = derivative_name(fieldfile.name, width, ext)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+            written += 1
+    return written
@@ -0,0 +1,129 @@
+"""
+A small job queue stored in the app database (no broker).
+
+enqueue() inserts a Job row in the caller's transaction, so a job exists if
+and only if the write that produced it committed (transactional outbox).
+`manage.py runjobs` claims due jobs in batches, runs the registered handler
+and deletes the row; failures are retried with exponential backoff until
+max_attempts, then kept as Failed for inspection.
+
+With settings.JOBS_EAGER = True, jobs run in-process right after the
+transaction commits instead, which is what tests and local development use.
+
+Handlers are registered with @job('name') in home/tasks.py. A handler runs
+in one transaction with the deletion of its row, unless it is registered
+with atomic=False: long handlers (a bulk import) commit their own work in
+steps and must be safe to run again from where they stopped.
+"""
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+NON_ATOMIC = set()
+LOCK_TIMEOUT = timedelta(minutes=10)
+BACKOFF_BASE = 10  # seconds; retry n waits BACKOFF_BASE * 2**n
+
+
+def job(name, atomic=True):
+    def register(func):
+        HANDLERS[name] = func
+        if not atomic:
+            NON_ATOMIC.add(name)
+        return func
+    return register
+
+
+def enqueue(name, **payload):
+    if name not in HANDLERS:
+        raise KeyError(f"Unknown job {name!r}")
+    if getattr(settings, 'JOBS_EAGER', False):
+        transaction.on_commit(lambda: HANDLERS[name](**payload))
+        return None
+    return Job.objects.create(name=name, payload=payload)
+
+
+def enqueue_many(name, payloads):
+    """enqueue() for many payloads of one job, in one INSERT."""
+    if name not in HANDLERS:
+        raise KeyError(f"Unknown job {name!r}")
+    if getattr(settings, 'JOBS_EAGER', False):
+        for payload in payloads:
+            transaction.on_commit(lambda payload=payload: HANDLERS[name](**payload))
+        return []
+    return Job.objects.bulk_create([Job(name=name, payload=payload) for payload in payloads])
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker, batch_size=50, now=None):
+    """Lock up to batch_size due jobs for `worker` and return them."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Jobs whose worker died mid-run count that as a failed attempt, so a
+        # job that kills its worker still ends up Failed after max_attempts.
+        # (The When sees attempts before this UPDATE increments it.)
+        Job.objects.filter(status='Running', locked_at__lt=now - LOCK_TIMEOUT).update(
+            status=Case(When(attempts__gte=F('max_attempts') - 1, then=Value('Failed')), default=Value('Queued')),
+            attempts=F('attempts') + 1,
+            locked_by='',
+            locked_at=None,
+            last_error=f"Worker stopped responding (no result after {LOCK_TIMEOUT})",
+        )
+
+        due = Job.objects.filter(status='Queued', run_at__lte=now).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('id', flat=True)[:batch_size])
+        Job.objects.filter(id__in=ids, status='Queued').update(status='Running', locked_by=worker, locked_at=now)
+    return list(Job.objects.filter(id__in=ids, status='Running', locked_by=worker).order_by('run_at', 'id'))
+
+
+def run(job_row):
+    """Run one claimed job; returns True on success."""
+    try:
+        if job_row.name in NON_ATOMIC:
+            HANDLERS[job_row.name](**job_row.payload)
+            Job.objects.filter(id=job_row.id).delete()
+        else:
+            with transaction.atomic():
+                HANDLERS[job_row.name](**job_row.payload)
+                Job.objects.filter(id=job_row.id).delete()
+        return True
+    except Exception:
+        attempts = job_row.attempts + 1
+        failed = attempts >= job_row.max_attempts
+        Job.objects.filter(id=job_row.id).update(
+            status='Failed' if failed else 'Queued',
+            attempts=attempts,
+            run_at=timezone.now() + timedelta(seconds=BACKOFF_BASE * 2 ** attempts),
+            locked_by='',
+            locked_at=None,
+            last_error=traceback.format_exc(),
+        )
+        logger.warning("Job %s #%s failed (attempt %s)", job_row.name, job_row.id, attempts, exc_info=True)
+        return False
+
+
+def run_batch(worker, batch_size=50):
+    """Claim and run one batch; returns (succeeded, failed)."""
+    ok = failed = 0
+    for job_row in claim(worker, batch_size):
+        if run(job_row):
+            ok += 1
+        else:
+            failed += 1
+    return ok, failed
@@ -0,0 +1,92 @@
+"""
+Farmer earnings ledger.
+
+Money owed to a farmer moves in two steps, both recorded as append-only
+LedgerEntry rows with the farmer's balance after each entry:
+
+- earning: a line reaches Delivered; its FarmerPayment.amount is added
+  to the balance (called from home.order_status and auto_deliver, in the
+  same transaction as the status change);
+- settlement: the payment is completed (`manage.py settle_payments`); the
+  amount leaves the balance.
+
+FarmerBalance holds the running totals, so a balance lookup is one row.
+Every post() locks the affected balance rows, writes all entries with one
+bulk_create and the new balances with one bulk_update.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import FarmerBalance, FarmerPayment, LedgerEntry
+
+SETTLE_CHUNK_SIZE = 1000
+
+Posting = namedtuple('Posting', 'farmer_id payment_id kind amount')
+
+
+@transaction.atomic
+def post(postings):
+    """Write postings (earning amounts positive, settlements negative)."""
+    if not postings:
+        return []
+    farmers = {p.farmer_id for p in postings}
+    FarmerBalance.objects.bulk_create([FarmerBalance(farmer_id=f) for f in farmers], ignore_conflicts=True)
+    balances = {b.farmer_id: b for b in FarmerBalance.objects.select_for_update().filter(farmer_id__in=farmers)}
+
+    entries = []
+    for p in postings:
+        balance = balances[p.farmer_id]
+        balance.balance += p.amount
+        if p.kind == 'earning':
+            balance.earned_total += p.amount
+        else:
+            balance.settled_total -= p.amount
+        entries.append(LedgerEntry(
+            farmer_id=p.farmer_id, payment_id=p.payment_id, kind=p.kind,
+            amount=p.amount, balance_after=balance.balance,
+        ))
+    LedgerEntry.objects.bulk_create(entries)
+    now = timezone.now()
+    for balance in balances.values():
+        balance.updated_at = now
+    FarmerBalance.objects.bulk_update(balances.values(), ['balance', 'earned_total', 'settled_total', 'updated_at'])
+    return entries
+
+
+def record_deliveries(order_item_ids):
+    """Earnings for lines that just reached Delivered."""
+    payments = FarmerPayment.objects.filter(order_item_id__in=list(order_item_ids)).values_list('farmer_id', 'id', 'amount')
+    return post([Posting(farmer_id, payment_id, 'earning', amount) for farmer_id, payment_id, amount in payments])
+
+
+def balance(farmer):
+    """The farmer's FarmerBalance (unsaved and zero if nothing was earned yet)."""
+    return FarmerBalance.objects.filter(farmer=farmer).first() or FarmerBalance(farmer=farmer)
+
+
+def settle(chunk_size=SETTLE_CHUNK_SIZE, farmer=None):
+    """
+    Complete pending payments of delivered lines, chunk by chunk.
+    Returns (payments settled, total amount).
+    """
+    due = FarmerPayment.objects.filter(status='Pending', order_item__farmerorder__status='Delivered')
+    if farmer is not None:
+        due = due.filter(farmer=farmer)
+    count, amount, last_id = 0, Decimal('0'), 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                due.select_for_update(of=('self',)).filter(id__gt=last_id)
+                .order_by('id').values_list('id', 'farmer_id', 'amount')[:chunk_size]
+            )
+            if not rows:
+                return count, amount
+            ids = [payment_id for payment_id, _, _ in rows]
+            FarmerPayment.objects.filter(id__in=ids, status='Pending').update(status='Completed')
+            post([Posting(farmer_id, payment_id, 'settlement', -paid) for payment_id, farmer_id, paid in rows])
+        count += len(rows)
+        amount += sum(paid for _, _, paid in rows)
+        last_id = ids[-1]
@@ -0,0 +1,48 @@
+"""
+Time-based order lifecycle.
+
+Orders move Pending -> Shipped -> Out for Delivery -> Delivered as they age
+(measured from created_at). advance_orders() moves whole cohorts, in chunks,
+through home.order_status.transition_orders so their FarmerOrder lines and
+line counters move with them, and is run periodically by
+`manage.py advance_orders`.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Order
+from .order_status import transition_orders
+
+STAGES = [
+    # (from, to, minimum order age)
+    (('Pending', 'Partially Cancelled', 'Partially Shipped'), 'Shipped', timedelta(days=1)),
+    (('Shipped',), 'Out for Delivery', timedelta(days=1, hours=12)),
+    (('Out for Delivery',), 'Delivered', timedelta(days=2)),
+]
+CHUNK_SIZE = 1000
+
+
+def advance_orders(now=None):
+    """Run every stage once; returns {to_status: orders moved}."""
+    now = now or timezone.now()
+    moved = {}
+    # Latest stage first, so an order moves at most one step per run and
+    # each status is held for at least one run.
+    for from_statuses, to_status, age in reversed(STAGES):
+        moved[to_status] = _advance(from_statuses, to_status, now - age)
+    return moved
+
+
+def _advance(from_statuses, to_status, cutoff):
+    """One stage, in chunks of CHUNK_SIZE orders."""
+    total = last_id = 0
+    while True:
+        due = list(
+            Order.objects.filter(status__in=from_statuses, created_at__lt=cutoff, id__gt=last_id)
+            .order_by('id').values_list('id', flat=True)[:CHUNK_SIZE]
+        )
+        if not due:
+            return total
+        total += len(transition_orders(due, to_status))
+        last_id = due[-1]
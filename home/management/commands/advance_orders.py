@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.lifecycle import advance_orders
+
+
+class Command(BaseCommand):
+    help = "Move orders through Pending -> Shipped -> Out for Delivery -> Delivered as they age."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running, every INTERVAL seconds (default: run once).")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            moved = advance_orders()
+            elapsed = time.perf_counter() - started
+            summary = ", ".join(f"{count} -> {status}" for status, count in moved.items())
+            self.stdout.write(f"{summary} in {elapsed:.2f}s")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.tasks import AUTO_DELIVER_CHUNK_SIZE, auto_update_delivered_orders
+
+
+class Command(BaseCommand):
+    help = "Mark farmer orders that have been Shipped for a day as Delivered and notify both sides."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=AUTO_DELIVER_CHUNK_SIZE)
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running, every INTERVAL seconds (default: run once).")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            delivered = auto_update_delivered_orders(chunk_size=options['chunk_size'])
+            elapsed = time.perf_counter() - started
+            rate = delivered / elapsed if elapsed else 0
+            self.stdout.write(f"{delivered} farmer orders delivered in {elapsed:.2f}s ({rate:.0f}/s)")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from home.models import Product, Review
+
+STAR_FIELDS = [f'rating_{stars}' for stars in range(1, 6)]
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating aggregates on Product from Review rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        # One grouped pass over the reviews table
+        totals = (
+            Review.objects.values('product_id')
+            .annotate(
+                count=Count('id'),
+                total=Sum('rating'),
+                **{field: Count('id', filter=Q(rating=stars)) for stars, field in enumerate(STAR_FIELDS, 1)},
+            )
+            .order_by()
+        )
+
+        products = []
+        for row in totals:
+            product = Product(pk=row['product_id'], rating_count=row['count'], rating_sum=row['total'])
+            for field in STAR_FIELDS:
+                setattr(product, field, row[field])
+            products.append(product)
+
+        with transaction.atomic():
+            Product.objects.update(rating_count=0, rating_sum=0, **{field: 0 for field in STAR_FIELDS})
+            Product.objects.bulk_update(
+                products,
+                ['rating_count', 'rating_sum'] + STAR_FIELDS,
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled ratings for {len(products)} products."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from home.images import UNREADABLE, build_derivatives
+from home.models import Category, Product, Review
+
+SOURCES = [
+    (Product, 'image'),
+    (Category, 'image'),
+    (Review, 'review_image'),
+]
+
+
+class Command(BaseCommand):
+    help = "Build WebP/JPEG derivatives for existing product, category and review images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild derivatives that already exist.")
+
+    def handle(self, *args, **options):
+        for model, field in SOURCES:
+            images = written = failed = 0
+            rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).only('id', field)
+            for obj in rows.iterator(chunk_size=200):
+                images += 1
+                try:
+                    written += build_derivatives(getattr(obj, field), force=options['force'])
+                except UNREADABLE as e:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} #{obj.id}: {e}")
+            self.stdout.write(f"{model.__name__}: {images} images, {written} files written, {failed} failed")
+        self.stdout.write(self.style.SUCCESS("Done."))
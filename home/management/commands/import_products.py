@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from home.models import ProductImport
+from home.product_import import BATCH_SIZE, run
+
+
+class Command(BaseCommand):
+    help = "Import a farmer's products from a CSV file and a zip of their images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('farmer', help="Username of the farmer the products belong to.")
+        parser.add_argument('csv_path')
+        parser.add_argument('--images', help="Zip archive with the images the CSV names.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        farmer = User.objects.filter(username=options['farmer']).first()
+        if farmer is None:
+            raise CommandError(f"No user named {options['farmer']!r}")
+
+        product_import = ProductImport(farmer=farmer)
+        with open(options['csv_path'], 'rb') as f:
+            product_import.csv_file.save(os.path.basename(f.name), File(f), save=False)
+        if options['images']:
+            with open(options['images'], 'rb') as f:
+                product_import.images.save(os.path.basename(f.name), File(f), save=False)
+        product_import.save()
+
+        started = time.perf_counter()
+
+        def progress(p):
+            elapsed = time.perf_counter() - started
+            rate = p.rows_read / elapsed if elapsed else 0
+            self.stdout.write(f"{p.rows_read} rows: {p.created} created, {p.failed} failed ({rate:.0f} rows/s)")
+
+        product_import = run(product_import, options['batch_size'], progress)
+        for line, message in product_import.errors[:20]:
+            self.stderr.write(f"line {line}: {message}")
+        style = self.style.SUCCESS if product_import.status == 'Done' else self.style.ERROR
+        self.stdout.write(style(
+            f"Import #{product_import.pk} {product_import.status}: {product_import.created} created, "
+            f"{product_import.failed} failed in {time.perf_counter() - started:.2f}s."
+        ))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.retention import CHUNK_SIZE, max_per_user, prune, retention_days
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete read notifications older than the retention age or beyond the per-user cap, "
+        "optionally archiving them to a gzipped JSON Lines file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Retention age (default: settings.NOTIFICATION_RETENTION_DAYS).")
+        parser.add_argument('--max-per-user', type=int, default=None,
+                            help="Per-user cap (default: settings.NOTIFICATION_MAX_PER_USER).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--archive', metavar='PATH.jsonl.gz',
+                            help="Append removed rows to this file before deleting them.")
+
+    def handle(self, *args, **options):
+        days = retention_days() if options['days'] is None else options['days']
+        cap = max_per_user() if options['max_per_user'] is None else options['max_per_user']
+        if days < 0 or cap < 1:
+            raise CommandError("--days must be >= 0 and --max-per-user >= 1")
+
+        started = time.perf_counter()
+        removed = prune(days=days, cap=cap, archive=options['archive'], chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        total = sum(removed.values())
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{removed['expired']} older than {days} days, {removed['over_cap']} over the cap of {cap}: "
+            f"{total} rows in {elapsed:.2f}s ({rate:.0f} rows/s)"
+        )
+        if options['archive'] and total:
+            self.stdout.write(f"Archived to {options['archive']}")
@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.analytics import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the FarmerDailyStats rollup from FarmerOrder history."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} farmer/day rows in {time.perf_counter() - started:.2f}s."))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.stock_alerts import reevaluate
+
+
+class Command(BaseCommand):
+    help = "Rebuild the low-stock alert set from current stock and per-product thresholds."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        raised, cleared = reevaluate()
+        self.stdout.write(self.style.SUCCESS(
+            f"Raised {raised} and cleared {cleared} stock alerts in {time.perf_counter() - started:.2f}s."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home.orders import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Cancel orders whose online payment was abandoned and return their reserved stock."
+
+    def handle(self, *args, **options):
+        cancelled = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f"Released stock for {cancelled} abandoned orders."))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.jobs import run_batch, worker_id
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (see home/jobs.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit.")
+
+    def handle(self, *args, **options):
+        worker = worker_id()
+        self.stdout.write(f"Worker {worker} started")
+        while True:
+            ok, failed = run_batch(worker, options['batch_size'])
+            if ok or failed:
+                self.stdout.write(f"{ok} done, {failed} failed")
+                continue
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
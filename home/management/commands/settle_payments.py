@@ -0,0 +1,29 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from home.ledger import SETTLE_CHUNK_SIZE, settle
+
+
+class Command(BaseCommand):
+    help = "Mark pending payments of delivered order lines as Completed and post them to the ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=SETTLE_CHUNK_SIZE)
+        parser.add_argument('--farmer', help="Only settle this farmer's payments (username).")
+
+    def handle(self, *args, **options):
+        farmer = None
+        if options['farmer']:
+            farmer = User.objects.filter(username=options['farmer']).first()
+            if farmer is None:
+                raise CommandError(f"No user named {options['farmer']!r}")
+
+        started = time.perf_counter()
+        count, amount = settle(options['chunk_size'], farmer)
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Settled {count} payments worth ₹{amount} in {elapsed:.2f}s ({rate:.0f}/s)."
+        ))
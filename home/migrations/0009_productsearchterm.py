@@ -0,0 +1,73 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:00
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of home.search's tokenizer and weights as of this migration, so
+# later changes to the live module cannot change what this migration does.
+NAME_WEIGHT = 10
+CATEGORY_WEIGHT = 5
+DETAILS_WEIGHT = 1
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 50
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(text.lower())
+        if len(token) >= MIN_TERM_LENGTH
+    ]
+
+
+def build_postings(product):
+    postings = {}
+    fields = [
+        (product.name, NAME_WEIGHT),
+        (product.ctgry.name if product.ctgry_id else '', CATEGORY_WEIGHT),
+        (product.details, DETAILS_WEIGHT),
+    ]
+    for text, weight in fields:
+        for term in tokenize(text):
+            postings[term] = postings.get(term, 0) + weight
+    return postings
+
+
+def build_index(apps, schema_editor):
+    Product = apps.get_model('home', 'Product')
+    ProductSearchTerm = apps.get_model('home', 'ProductSearchTerm')
+    postings = []
+    for product in Product.objects.select_related('ctgry').iterator():
+        postings.extend(
+            ProductSearchTerm(term=term, product=product, weight=weight)
+            for term, weight in build_postings(product).items()
+        )
+    ProductSearchTerm.objects.bulk_create(postings, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0008_review_review_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='home.product')),
+            ],
+            options={
+                'unique_together': {('term', 'product')},
+            },
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0013_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='farmerorder',
+            index=models.Index(fields=['status', 'updated_at'], name='home_farmer_status_11c86e_idx'),
+        ),
+    ]
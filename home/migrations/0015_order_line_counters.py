@@ -0,0 +1,65 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:16
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# home.order_status.COUNTERS as of this migration
+COUNTERS = {
+    'Pending': 'lines_pending',
+    'Shipped': 'lines_shipped',
+    'Out for Delivery': 'lines_out_for_delivery',
+    'Delivered': 'lines_delivered',
+    'Cancelled': 'lines_cancelled',
+}
+
+
+def count_lines(apps, schema_editor):
+    Order = apps.get_model('home', 'Order')
+    FarmerOrder = apps.get_model('home', 'FarmerOrder')
+    orders = {}
+    rows = FarmerOrder.objects.values('order_item__order_id', 'status').annotate(n=Count('id'))
+    for row in rows:
+        order = orders.setdefault(row['order_item__order_id'], Order(pk=row['order_item__order_id']))
+        setattr(order, COUNTERS[row['status']], row['n'])
+    Order.objects.bulk_update(orders.values(), list(COUNTERS.values()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0014_farmerorder_status_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='lines_cancelled',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lines_delivered',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lines_out_for_delivery',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lines_pending',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='lines_shipped',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Shipped', 'Shipped'), ('Out for Delivery', 'Out for Delivery'), ('Delivered', 'Delivered'), ('Cancelled', 'Cancelled'), ('Partially Shipped', 'Partially Shipped'), ('Partially Cancelled', 'Partially Cancelled')], default='Pending', max_length=20),
+        ),
+        migrations.RunPython(count_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:18
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+# (pattern, event_type, related_type) for the messages written so far;
+# only the delivered message carries the id of what it is about.
+MESSAGE_EVENTS = [
+    (re.compile(r"^Your order #(\d+) has been delivered!$"), 'order_delivered', 'order'),
+    (re.compile(r"^New order for .+ \(\d+ pcs\)\.$"), 'new_order', ''),
+    (re.compile(r"^Your order for .+ x \d+ has been placed successfully!$"), 'order_placed', ''),
+    (re.compile(r"^Order .+ has been auto-marked as Delivered\.$"), 'line_auto_delivered', ''),
+    (re.compile(r"^Your order for .+ is now .+\.$"), 'line_status', ''),
+]
+
+
+def dedup_key(event_type, related_type, related_id, user_id):
+    # home.notifications.dedup_key as of this migration (no variant)
+    return f"{event_type}:{related_type}:{related_id}:{user_id}"
+
+
+def backfill_keys(apps, schema_editor):
+    Notification = apps.get_model('home', 'Notification')
+    seen, batch = set(), []
+    for notification in Notification.objects.order_by('id').iterator():
+        for pattern, event_type, related_type in MESSAGE_EVENTS:
+            match = pattern.match(notification.message)
+            if not match:
+                continue
+            notification.event_type = event_type
+            if related_type:
+                notification.related_type = related_type
+                notification.related_id = int(match.group(1))
+                key = dedup_key(event_type, related_type, notification.related_id, notification.user_id)
+                # Older code could send the same event twice; the first one keeps the key
+                if key not in seen:
+                    seen.add(key)
+                    notification.dedup_key = key
+            batch.append(notification)
+            break
+        if len(batch) >= 500:
+            Notification.objects.bulk_update(batch, ['event_type', 'related_type', 'related_id', 'dedup_key'])
+            batch = []
+    Notification.objects.bulk_update(batch, ['event_type', 'related_type', 'related_id', 'dedup_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0015_order_line_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dedup_key',
+            field=models.CharField(blank=True, max_length=150, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='event_type',
+            field=models.CharField(blank=True, choices=[('new_order', 'New order'), ('order_placed', 'Order placed'), ('line_status', 'Order item status'), ('line_auto_delivered', 'Auto-marked delivered'), ('order_delivered', 'Order delivered')], max_length=30),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='related_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='related_type',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('dedup_key',), name='unique_notification_dedup_key'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:23
+
+import django.db.models.deletion
+from django.conf import settings
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Max, Min, Q
+
+
+def watermarks_from_flags(apps, schema_editor):
+    # Read up to just before the oldest unread notification, or up to the
+    # newest one if everything was read.
+    Notification = apps.get_model('home', 'Notification')
+    NotificationWatermark = apps.get_model('home', 'NotificationWatermark')
+    rows = Notification.objects.values('user_id').annotate(
+        first_unread=Min('created_at', filter=Q(is_read=False)),
+        newest_read=Max('created_at', filter=Q(is_read=True)),
+    )
+    NotificationWatermark.objects.bulk_create([
+        NotificationWatermark(
+            user_id=row['user_id'],
+            last_read_at=row['first_unread'] - timedelta(microseconds=1) if row['first_unread'] else row['newest_read'],
+        )
+        for row in rows if row['newest_read']
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('home', '0016_notification_event_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationWatermark',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_watermark', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_read_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(watermarks_from_flags, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='notification',
+            name='is_read',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'created_at'], name='home_notifi_user_id_538efe_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:26
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+# home.analytics.STATUS_FIELDS as of this migration
+STATUS_FIELDS = {
+    'Delivered': ('lines_delivered', 'revenue_delivered'),
+    'Cancelled': ('lines_cancelled', None),
+}
+
+
+def backfill(apps, schema_editor):
+    """Same computation as home.analytics.rebuild() when this migration was written."""
+    FarmerOrder = apps.get_model('home', 'FarmerOrder')
+    FarmerDailyStats = apps.get_model('home', 'FarmerDailyStats')
+    total = ExpressionWrapper(
+        F('order_item__price') * F('order_item__quantity'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    rows = defaultdict(dict)
+    placed = (
+        FarmerOrder.objects.annotate(day=TruncDate('created_at'))
+        .values('farmer_id', 'day').annotate(n=Count('id'), revenue=Sum(total))
+    )
+    for row in placed:
+        rows[row['farmer_id'], row['day']].update(lines_placed=row['n'], revenue_placed=row['revenue'])
+    for status, (count_field, revenue_field) in STATUS_FIELDS.items():
+        moved = (
+            FarmerOrder.objects.filter(status=status).annotate(day=TruncDate('updated_at'))
+            .values('farmer_id', 'day').annotate(n=Count('id'), revenue=Sum(total))
+        )
+        for row in moved:
+            rows[row['farmer_id'], row['day']][count_field] = row['n']
+            if revenue_field:
+                rows[row['farmer_id'], row['day']][revenue_field] = row['revenue']
+    FarmerDailyStats.objects.bulk_create(
+        [FarmerDailyStats(farmer_id=farmer_id, day=day, **fields) for (farmer_id, day), fields in rows.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0017_notification_watermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmerDailyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('lines_placed', models.PositiveIntegerField(default=0)),
+                ('revenue_placed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('lines_delivered', models.PositiveIntegerField(default=0)),
+                ('revenue_delivered', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('lines_cancelled', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='farmerorder',
+            index=models.Index(fields=['farmer', 'status'], name='home_farmer_farmer__7d021a_idx'),
+        ),
+        migrations.AddField(
+            model_name='farmerdailystats',
+            name='farmer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='farmerdailystats',
+            constraint=models.UniqueConstraint(fields=('farmer', 'day'), name='unique_farmer_day'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
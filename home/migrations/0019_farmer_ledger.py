@@ -0,0 +1,74 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:27
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_ledger(apps, schema_editor):
+    # Earnings for lines already delivered, settlements for payments already completed
+    FarmerPayment = apps.get_model('home', 'FarmerPayment')
+    FarmerBalance = apps.get_model('home', 'FarmerBalance')
+    LedgerEntry = apps.get_model('home', 'LedgerEntry')
+    totals = defaultdict(lambda: {'balance': Decimal('0'), 'earned_total': Decimal('0'), 'settled_total': Decimal('0')})
+    entries = []
+    payments = (
+        FarmerPayment.objects.filter(order_item__farmerorder__status='Delivered')
+        .order_by('id').values_list('id', 'farmer_id', 'amount', 'status')
+    )
+    for payment_id, farmer_id, amount, status in payments:
+        t = totals[farmer_id]
+        t['balance'] += amount
+        t['earned_total'] += amount
+        entries.append(LedgerEntry(farmer_id=farmer_id, payment_id=payment_id, kind='earning',
+                                   amount=amount, balance_after=t['balance']))
+        if status == 'Completed':
+            t['balance'] -= amount
+            t['settled_total'] += amount
+            entries.append(LedgerEntry(farmer_id=farmer_id, payment_id=payment_id, kind='settlement',
+                                       amount=-amount, balance_after=t['balance']))
+    LedgerEntry.objects.bulk_create(entries, batch_size=500)
+    FarmerBalance.objects.bulk_create(
+        [FarmerBalance(farmer_id=farmer_id, **t) for farmer_id, t in totals.items()], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('home', '0018_farmer_daily_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmerBalance',
+            fields=[
+                ('farmer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('earned_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('settled_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('earning', 'Earning'), ('settlement', 'Settlement')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('farmer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='ledger_entries', to='home.farmerpayment')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('payment', 'kind'), name='unique_ledger_payment_kind')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
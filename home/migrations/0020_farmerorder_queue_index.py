@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0019_farmer_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # The new index covers the old one's prefix; build it before dropping that
+        migrations.AddIndex(
+            model_name='farmerorder',
+            index=models.Index(fields=['farmer', 'status', 'created_at'], name='home_farmer_farmer__0553e0_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='farmerorder',
+            name='home_farmer_farmer__7d021a_idx',
+        ),
+    ]
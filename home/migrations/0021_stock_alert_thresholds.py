@@ -0,0 +1,72 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:31
+
+import django.db.models.expressions
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Min
+
+
+def rebuild_alerts(apps, schema_editor):
+    Product = apps.get_model('home', 'Product')
+    StockAlert = apps.get_model('home', 'StockAlert')
+    # Earlier code could raise several alerts per product: keep the first
+    keep = StockAlert.objects.values('product_id').annotate(first=Min('id')).values_list('first', flat=True)
+    StockAlert.objects.exclude(id__in=list(keep)).delete()
+
+    # Then the same rebuild as home.stock_alerts.reevaluate() when this
+    # migration was written: alerts for exactly the products at or below
+    # their threshold.
+    low = Product.objects.alias(margin=F('stock') - F('low_stock_threshold')).filter(margin__lte=0)
+    StockAlert.objects.exclude(product__in=low.values('id')).delete()
+    missing = low.exclude(id__in=StockAlert.objects.values('product_id'))
+    StockAlert.objects.bulk_create(
+        [
+            StockAlert(product_id=pk, user_id=user_id, threshold=threshold)
+            for pk, user_id, threshold in missing.values_list('id', 'user_id', 'low_stock_threshold')
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0020_farmerorder_queue_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='stockalert',
+            name='is_alerted',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='low_stock_threshold',
+            field=models.PositiveIntegerField(default=5),
+        ),
+        migrations.AddField(
+            model_name='stockalert',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='event_type',
+            field=models.CharField(blank=True, choices=[('new_order', 'New order'), ('order_placed', 'Order placed'), ('line_status', 'Order item status'), ('line_auto_delivered', 'Auto-marked delivered'), ('order_delivered', 'Order delivered'), ('low_stock', 'Low stock')], max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('stock'), '-', models.F('low_stock_threshold')), name='product_stock_margin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(fields=['user', 'created_at'], name='home_stocka_user_id_21440a_idx'),
+        ),
+        migrations.RunPython(rebuild_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(fields=('product',), name='unique_stock_alert_product'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0023_ledger_payment_set_null'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='checkouttoken',
+            name='key',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='checkouttoken',
+            constraint=models.UniqueConstraint(fields=('user', 'key'), name='unique_user_checkout_token'),
+        ),
+    ]
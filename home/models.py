@@ -1,7 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models import Sum, Count
+from django.db.models import Sum, Count, F
 
 
 class Category(models.Model):
@@ -31,16 +31,56 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     unit = models.CharField(max_length=10, choices=UNIT_CHOICES, default='kg')
     stock = models.PositiveIntegerField(default=0)
+    # Stock at or below this raises a StockAlert (home/stock_alerts.py)
+    low_stock_threshold = models.PositiveIntegerField(default=5)
+
+    # Rating aggregates, maintained by the Review signals in home/signals.py
+    # (rebuild with `manage.py backfill_ratings`)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Products at or below their threshold, for stock_alerts.low_stock()
+            models.Index(F('stock') - F('low_stock_threshold'), name='product_stock_margin_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so a category change can invalidate the old listing too
+        instance._loaded_ctgry_id = instance.__dict__.get('ctgry_id')
+        return instance
 
     def average_rating(self):
-        reviews = self.review_set.all()
-        if reviews:
-            return sum(r.rating for r in reviews) / len(reviews)
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
         return 0
 
+    def rating_histogram(self):
+        """[(stars, count), ...] from 5 stars down to 1"""
+        return [(stars, getattr(self, f'rating_{stars}')) for stars in range(5, 0, -1)]
+
     def __str__(self):
         return self.name
 
+class ProductSearchTerm(models.Model):
+    """Inverted index posting: one row per (term, product), see home/search.py"""
+    term = models.CharField(max_length=50)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('term', 'product')
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id} ({self.weight})"
+
 class Address(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=100)
@@ -54,9 +94,11 @@ class Address(models.Model):
         return f"{self.full_name}, {self.city}"
 
 class Review(models.Model):
+    RATING_CHOICES = [(i, str(i)) for i in range(1, 6)]
+
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    rating = models.IntegerField()
+    rating = models.IntegerField(choices=RATING_CHOICES)
     comment = models.TextField()
     review_image = models.ImageField(upload_to='review_photos/', blank=True, null=True) 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -65,13 +107,19 @@ class Review(models.Model):
         return f"{self.product.name} review by {self.user.username}"
 
 class Order(models.Model):
-    STATUS_CHOICES = [
+    # States of a single line (FarmerOrder)
+    LINE_STATUS_CHOICES = [
         ('Pending', 'Pending'),
         ('Shipped', 'Shipped'),
         ('Out for Delivery', 'Out for Delivery'),
         ('Delivered', 'Delivered'),
         ('Cancelled', 'Cancelled'),
     ]
+    # An order can also be part-way, derived from its line counters (home/order_status.py)
+    STATUS_CHOICES = LINE_STATUS_CHOICES + [
+        ('Partially Shipped', 'Partially Shipped'),
+        ('Partially Cancelled', 'Partially Cancelled'),
+    ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     address = models.CharField(max_length=255, default='No address')
@@ -80,6 +128,13 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    # How many of the order's FarmerOrder lines are in each state
+    lines_pending = models.PositiveIntegerField(default=0)
+    lines_shipped = models.PositiveIntegerField(default=0)
+    lines_out_for_delivery = models.PositiveIntegerField(default=0)
+    lines_delivered = models.PositiveIntegerField(default=0)
+    lines_cancelled = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}  ({self.status})"
 
@@ -117,13 +172,38 @@ class FarmerOrder(models.Model):
     """Track orders specific to a farmer's products"""
     farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='farmer_orders')
     order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE)
-    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, default='Pending')
+    status = models.CharField(max_length=20, choices=Order.LINE_STATUS_CHOICES, default='Pending')
     created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+            # The farmer's order queue (home/order_queue.py); its prefix
+            # serves the dashboard's per-status counts as well.
+            models.Index(fields=['farmer', 'status', 'created_at']),
+        ]
+
     def __str__(self):
         return f"Farmer {self.farmer.username} - {self.order_item.product.name}"
 
+
+class FarmerDailyStats(models.Model):
+    """Per-farmer, per-day order figures, kept up to date by home/analytics.py"""
+    farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    lines_placed = models.PositiveIntegerField(default=0)
+    revenue_placed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    lines_delivered = models.PositiveIntegerField(default=0)
+    revenue_delivered = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    lines_cancelled = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['farmer', 'day'], name='unique_farmer_day')]
+
+    def __str__(self):
+        return f"{self.farmer_id} {self.day}: {self.lines_placed} placed, {self.lines_delivered} delivered"
+
 class FarmerPayment(models.Model):
     """Track payments/earnings for farmers"""
     farmer = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -135,23 +215,180 @@ class FarmerPayment(models.Model):
     def __str__(self):
         return f"{self.farmer.username} - {self.amount} ({self.status})"
 
+
+class FarmerBalance(models.Model):
+    """A farmer's running totals, kept in step with LedgerEntry by home/ledger.py"""
+    farmer = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='balance')
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)   # earned, not yet settled
+    earned_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    settled_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.farmer_id}: {self.balance} outstanding"
+
+
+class LedgerEntry(models.Model):
+    """Append-only record of every change to a FarmerBalance"""
+    KIND_CHOICES = [
+        ('earning', 'Earning'),        # a line was delivered: +amount
+        ('settlement', 'Settlement'),  # its payment was completed: -amount
+    ]
+
+    farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_entries')
+    # Entries keep their farmer and amount, so deleting the order line (product,
+    # account or order deletion) only unlinks them.
+    payment = models.ForeignKey(
+        FarmerPayment, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries',
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['payment', 'kind'], name='unique_ledger_payment_kind')]
+
+    def __str__(self):
+        return f"{self.farmer_id} {self.kind} {self.amount} -> {self.balance_after}"
+
 class Notification(models.Model):
     """Notifications for farmers/customers"""
+    EVENT_CHOICES = [
+        ('new_order', 'New order'),                      # farmer, per order item
+        ('order_placed', 'Order placed'),                # customer, per order item
+        ('line_status', 'Order item status'),            # customer, per farmer order + status
+        ('line_auto_delivered', 'Auto-marked delivered'),  # farmer, per farmer order
+        ('order_delivered', 'Order delivered'),          # customer, per order
+        ('low_stock', 'Low stock'),                      # farmer, per stock alert
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
-    is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # What the notification is about; see home/notifications.py
+    event_type = models.CharField(max_length=30, choices=EVENT_CHOICES, blank=True)
+    related_type = models.CharField(max_length=30, blank=True)
+    related_id = models.PositiveIntegerField(null=True, blank=True)
+    dedup_key = models.CharField(max_length=150, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dedup_key'], name='unique_notification_dedup_key'),
+        ]
+        indexes = [models.Index(fields=['user', 'created_at'])]
 
     def __str__(self):
-        return f"{self.user.username} - {'Read' if self.is_read else 'Unread'}"
+        return f"{self.user.username} - {self.message[:40]}"
+
+
+class NotificationWatermark(models.Model):
+    """A user has read every notification created up to last_read_at"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_watermark')
+    last_read_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} read up to {self.last_read_at}"
 
 
 class StockAlert(models.Model):
-    """Low stock alerts for farmers"""
+    """A product at or below its low-stock threshold, see home/stock_alerts.py"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)  # the product's farmer
     threshold = models.PositiveIntegerField(default=5)
-    is_alerted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['product'], name='unique_stock_alert_product')]
+        indexes = [models.Index(fields=['user', 'created_at'])]
 
     def __str__(self):
         return f"{self.product.name} - {self.user.username}"
+
+
+class StockReservation(models.Model):
+    """Stock taken from a product for one order line, see home/orders.py"""
+    STATUS_CHOICES = [
+        ('Held', 'Held'),            # awaiting online payment, expires
+        ('Committed', 'Committed'),  # paid or cash on delivery
+        ('Released', 'Released'),    # returned to stock
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Held')
+    expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'expires_at'])]
+
+    def __str__(self):
+        return f"{self.product_id} x {self.quantity} for order #{self.order_id} ({self.status})"
+
+
+class ProductImport(models.Model):
+    """A farmer's bulk product upload (CSV plus optional image zip), see home/product_import.py"""
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    ]
+
+    farmer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='product_imports')
+    csv_file = models.FileField(upload_to='imports/')
+    images = models.FileField(upload_to='imports/', blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    # Progress, committed with each batch; rows_read is also where a retry resumes
+    rows_read = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)  # [[line, message], ...], first MAX_ERRORS only
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import #{self.id} by {self.farmer.username} ({self.status})"
+
+
+class CheckoutToken(models.Model):
+    """Idempotency key issued by checkout; one order per user and token"""
+    key = models.CharField(max_length=64)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Per user: a token another customer already used must not fail this one's checkout
+        constraints = [models.UniqueConstraint(fields=['user', 'key'], name='unique_user_checkout_token')]
+
+    def __str__(self):
+        return f"{self.key} -> order #{self.order_id}"
+
+
+class Job(models.Model):
+    """Background job / transactional outbox row, see home/jobs.py"""
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at'])]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
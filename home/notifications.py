@@ -0,0 +1,182 @@
+"""
+Typed notifications.
+
+Every notification the app writes has an event type, the object it is
+about (related_type/related_id) and a dedup_key with a unique constraint,
+so writing the same event twice (a retried job, two workers, two code
+paths reaching the same state) leaves a single row. Nothing has to search
+message text to find out whether a notification was already sent.
+
+A Dispatcher collects everything one unit of work produces (placing an
+order, a batch of status changes) and writes it with a single
+bulk_create, merging the lines of one order into one message per
+recipient.
+
+Read state is a per-user watermark (NotificationWatermark.last_read_at):
+a notification is unread if it was created after it. Opening the first
+notifications page moves the watermark with a single-row write.
+"""
+import hashlib
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from . import badges
+from .models import Notification, NotificationWatermark
+from .pagination import CursorPaginator
+
+PAGE_SIZE = 20
+
+# event_type: (message for one line, summary for several lines of one order)
+MESSAGES = {
+    'new_order': ("New order for {item}.", "New order #{order_id}: {items}."),
+    'order_placed': (
+        "Your order for {item} has been placed successfully!",
+        "Your order #{order_id} has been placed successfully: {items}.",
+    ),
+    'line_status': ("Your order for {item} is now {variant}.", "Your order #{order_id}: {items} are now {variant}."),
+    'line_auto_delivered': (
+        "Order {item} has been auto-marked as Delivered.",
+        "Order #{order_id}: {items} have been auto-marked as Delivered.",
+    ),
+    'order_delivered': ("Your order #{order_id} has been delivered!", None),
+    'low_stock': ("Low stock: {item}.", "Low stock after order #{order_id}: {items}."),
+}
+
+
+def dedup_key(event_type, related_type, related_id, user_id, variant=''):
+    key = f"{event_type}:{related_type}:{related_id}:{user_id}"
+    return f"{key}:{variant}" if variant else key
+
+
+def build(user_id, event_type, related_type, related_id, message, variant=''):
+    """An unsaved Notification for send()."""
+    return Notification(
+        user_id=user_id,
+        message=message,
+        event_type=event_type,
+        related_type=related_type,
+        related_id=related_id,
+        dedup_key=dedup_key(event_type, related_type, related_id, user_id, variant),
+    )
+
+
+def send(notifications):
+    """Write a batch in one INSERT; events that were already sent are skipped."""
+    if not notifications:
+        return
+    # Drop events already sent so unread badges only count new rows; the
+    # unique key still settles a concurrent writer.
+    sent = set(
+        Notification.objects.filter(dedup_key__in=[n.dedup_key for n in notifications])
+        .values_list('dedup_key', flat=True)
+    )
+    new = [n for n in notifications if n.dedup_key not in sent]
+    Notification.objects.bulk_create(new, ignore_conflicts=True)
+    counts = Counter(n.user_id for n in new)
+    transaction.on_commit(lambda: badges.notifications_added(counts))
+
+
+def notify(user_id, event_type, related_type, related_id, message, variant=''):
+    """Write a single notification once; returns (notification, created)."""
+    notification, created = Notification.objects.get_or_create(
+        dedup_key=dedup_key(event_type, related_type, related_id, user_id, variant),
+        defaults={
+            'user_id': user_id,
+            'message': message,
+            'event_type': event_type,
+            'related_type': related_type,
+            'related_id': related_id,
+        },
+    )
+    if created:
+        transaction.on_commit(lambda: badges.notifications_added({user_id: 1}))
+    return notification, created
+
+
+class Dispatcher:
+    """
+    Gathers notifications and writes them in one bulk_create on flush().
+
+    Lines added for the same (user, event, order, variant) become one
+    notification. It keeps the single-line message and key when only one
+    line was added, and otherwise gets a per-order summary keyed by the
+    set of lines it covers. Usable as a context manager that flushes on
+    success.
+    """
+
+    def __init__(self):
+        self._groups = defaultdict(list)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, user_id, event_type, order_id, related_type, related_id, item='', variant=''):
+        self._groups[(user_id, event_type, order_id, variant)].append((related_type, related_id, item))
+
+    def notifications(self):
+        notifications = []
+        for (user_id, event_type, order_id, variant), lines in self._groups.items():
+            single, summary = MESSAGES[event_type]
+            if len(lines) == 1 or summary is None:
+                related_type, related_id, item = lines[0]
+                message = single.format(item=item, order_id=order_id, variant=variant)
+                notifications.append(build(user_id, event_type, related_type, related_id, message, variant))
+                continue
+            ids = ",".join(sorted(str(related_id) for _, related_id, _ in lines))
+            digest = hashlib.md5(ids.encode()).hexdigest()[:12]
+            items = ", ".join(item for _, _, item in lines)
+            message = summary.format(items=items, order_id=order_id, variant=variant)
+            key_variant = f"{variant}:{digest}" if variant else digest
+            notifications.append(build(user_id, event_type, 'order', order_id, message, key_variant))
+        return notifications
+
+    def flush(self):
+        """Write everything gathered so far; returns how many notifications."""
+        notifications = self.notifications()
+        send(notifications)
+        self._groups.clear()
+        return len(notifications)
+
+
+def last_read_at(user_id):
+    return (
+        NotificationWatermark.objects.filter(user_id=user_id)
+        .values_list('last_read_at', flat=True).first()
+    )
+
+
+def unread(user_id):
+    """The user's unread notifications."""
+    notifications = Notification.objects.filter(user_id=user_id)
+    watermark = last_read_at(user_id)
+    return notifications if watermark is None else notifications.filter(created_at__gt=watermark)
+
+
+def read_page(user, cursor=None, per_page=PAGE_SIZE):
+    """
+    One page of `user`'s notifications, newest first, each flagged .is_new.
+
+    The page and the user's watermark come from one query on the
+    (user, created_at) index. Opening the first page marks everything up
+    to its newest notification as read with one upsert, and skips the
+    write when nothing new arrived.
+    """
+    watermark = NotificationWatermark.objects.filter(user_id=OuterRef('user_id')).values('last_read_at')
+    notifications = Notification.objects.filter(user=user).annotate(read_until=Subquery(watermark))
+    page = CursorPaginator(notifications, ['-created_at', '-id'], per_page).get_page(cursor)
+    for notification in page:
+        notification.is_new = notification.read_until is None or notification.created_at > notification.read_until
+
+    if page and not page.has_previous() and page[0].is_new:
+        NotificationWatermark.objects.bulk_create(
+            [NotificationWatermark(user=user, last_read_at=page[0].created_at)],
+            update_conflicts=True, unique_fields=['user'], update_fields=['last_read_at'],
+        )
+        transaction.on_commit(lambda: badges.notifications_read(user.id))
+    return page
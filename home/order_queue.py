@@ -0,0 +1,76 @@
+"""
+The farmer's order queue.
+
+A farmer's FarmerOrders filtered by line status and by the day they were
+placed, newest first, one cursor page at a time. With a status selected
+the page is a range read on the (farmer, status, created_at) index, so a
+farmer with years of delivered lines opens today's Pending queue as fast
+as a new farmer does. Bulk actions move the selected lines, or every line
+matching the filters up to BULK_LIMIT, with order_status.set_lines_status.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import FarmerOrder, Order
+from .order_status import LINE_TRANSITIONS
+from .pagination import CursorPaginator
+
+PAGE_SIZE = 50
+BULK_LIMIT = 500
+DEFAULT_STATUS = 'Pending'
+LINE_STATUSES = [status for status, _ in Order.LINE_STATUS_CHOICES]
+# Forward moves only; cancelling also returns stock, so it stays per line
+BULK_STATUSES = ['Shipped', 'Out for Delivery', 'Delivered']
+
+
+def _day(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def parse_filters(params):
+    """status / since / until from a GET or POST QueryDict; bad values are dropped."""
+    status = params.get('status', DEFAULT_STATUS)
+    return {
+        'status': status if status in LINE_STATUSES else None,  # 'all' or junk: every status
+        'since': _day(params.get('since')),
+        'until': _day(params.get('until')),
+    }
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def queue(farmer, status=None, since=None, until=None):
+    """The farmer's lines matching the filters (since/until: placed on or between those days)."""
+    lines = FarmerOrder.objects.filter(farmer=farmer)
+    if status:
+        lines = lines.filter(status=status)
+    # Plain range on created_at rather than __date, so the index applies
+    if since:
+        lines = lines.filter(created_at__gte=_start_of(since))
+    if until:
+        lines = lines.filter(created_at__lt=_start_of(until + timedelta(days=1)))
+    return lines
+
+
+def page(farmer, filters, cursor=None, per_page=PAGE_SIZE):
+    lines = queue(farmer, **filters).select_related('order_item__product', 'order_item__order')
+    lines = CursorPaginator(lines, ['-created_at', '-id'], per_page).get_page(cursor)
+    for line in lines:
+        line.next_statuses = [s for s in LINE_STATUSES if s in LINE_TRANSITIONS[line.status]]
+    return lines
+
+
+def matching_ids(farmer, filters, status):
+    """
+    Ids of the lines a 'whole queue' bulk move to `status` applies to: those
+    matching the filters that can move there, oldest first, at most BULK_LIMIT.
+    """
+    sources = [source for source, targets in LINE_TRANSITIONS.items() if status in targets]
+    lines = queue(farmer, **filters).filter(status__in=sources)
+    return list(lines.order_by('created_at', 'id').values_list('id', flat=True)[:BULK_LIMIT])
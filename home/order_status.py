@@ -0,0 +1,278 @@
+"""
+Order status state machine.
+
+Every Order keeps a counter of its FarmerOrder lines per state
+(lines_pending, lines_shipped, ...). A line changing state moves one count
+with F-expressions, and Order.status is derived from the counters alone, so
+updating a status costs the same few queries for a 1-line or a 100-line
+order. Orders also have part-way states: 'Partially Shipped' (some lines
+shipped, some still pending) and 'Partially Cancelled' (some lines
+cancelled, the rest not shipped yet).
+
+Lines and orders only move along LINE_TRANSITIONS / ORDER_TRANSITIONS;
+anything else raises InvalidTransition. set_lines_status() moves many of a
+farmer's lines at once for the order queue's bulk actions.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import analytics, ledger
+from .models import FarmerOrder, Order
+from .notifications import Dispatcher
+from .jobs import enqueue
+
+COUNTERS = {
+    'Pending': 'lines_pending',
+    'Shipped': 'lines_shipped',
+    'Out for Delivery': 'lines_out_for_delivery',
+    'Delivered': 'lines_delivered',
+    'Cancelled': 'lines_cancelled',
+}
+
+LINE_TRANSITIONS = {
+    'Pending': {'Shipped', 'Cancelled'},
+    'Shipped': {'Out for Delivery', 'Delivered'},
+    'Out for Delivery': {'Delivered'},
+    'Delivered': set(),
+    'Cancelled': set(),
+}
+
+ORDER_TRANSITIONS = {
+    'Pending': {'Shipped', 'Cancelled'},
+    'Partially Cancelled': {'Shipped', 'Cancelled'},
+    'Partially Shipped': {'Shipped'},
+    'Shipped': {'Out for Delivery', 'Delivered'},
+    'Out for Delivery': {'Delivered'},
+    'Delivered': set(),
+    'Cancelled': set(),
+}
+
+# Moving a whole order to a state moves every line that is still behind it
+LINES_BEHIND = {
+    'Shipped': ['Pending'],
+    'Out for Delivery': ['Pending', 'Shipped'],
+    'Delivered': ['Pending', 'Shipped', 'Out for Delivery'],
+    'Cancelled': ['Pending'],
+}
+
+
+class InvalidTransition(Exception):
+    def __init__(self, current, target):
+        self.current, self.target = current, target
+        super().__init__(f"cannot move from {current} to {target}")
+
+
+def derive_status(counts):
+    """Order status from a {line state: count} mapping (or an Order)."""
+    if isinstance(counts, Order):
+        counts = {state: getattr(counts, field) for state, field in COUNTERS.items()}
+    cancelled = counts.get('Cancelled', 0)
+    pending = counts.get('Pending', 0)
+    delivered = counts.get('Delivered', 0)
+    out = counts.get('Out for Delivery', 0)
+    active = sum(counts.values()) - cancelled
+
+    if active == 0:
+        return 'Cancelled' if cancelled else None  # None: order has no lines
+    if pending == active:
+        return 'Partially Cancelled' if cancelled else 'Pending'
+    if pending:
+        return 'Partially Shipped'
+    if delivered == active:
+        return 'Delivered'
+    if out + delivered == active:
+        return 'Out for Delivery'
+    return 'Shipped'
+
+
+def _notify_delivered(delivered, dispatcher=None):
+    """Customer notifications for [(order_id, user_id)] that became Delivered."""
+    own = dispatcher is None
+    dispatcher = dispatcher or Dispatcher()
+    for order_id, user_id in delivered:
+        dispatcher.add(user_id, 'order_delivered', order_id, 'order', order_id)
+    if own:
+        dispatcher.flush()
+
+
+def can_transition(current, target):
+    return target in ORDER_TRANSITIONS.get(current, ())
+
+
+def _delta(moves, sign):
+    if len(moves) == 1:
+        (_, n), = moves.items()
+        return Value(sign * n)
+    return Case(
+        *[When(pk=pk, then=Value(sign * n)) for pk, n in moves.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+@transaction.atomic
+def move_lines(moves, old, new, dispatcher=None):
+    """
+    Record lines of orders moving from `old` to `new` ({order_id: lines}).
+
+    Call after the FarmerOrder rows themselves were updated. Returns
+    {order_id: status} for the orders whose status changed; customers
+    are notified when their order becomes Delivered, through `dispatcher`
+    if one is given (home/notifications.py) or with a bulk_create here.
+    """
+    if not moves:
+        return {}
+    old_field, new_field = COUNTERS[old], COUNTERS[new]
+    Order.objects.filter(pk__in=moves).update(**{
+        old_field: F(old_field) + _delta(moves, -1),
+        new_field: F(new_field) + _delta(moves, 1),
+    })
+
+    changed = {}
+    for order in Order.objects.filter(pk__in=moves).only('id', 'user_id', 'status', *COUNTERS.values()):
+        status = derive_status(order)
+        if status and status != order.status:
+            changed[order.id] = (status, order.user_id)
+
+    by_status = defaultdict(list)
+    for order_id, (status, _) in changed.items():
+        by_status[status].append(order_id)
+    for status, ids in by_status.items():
+        Order.objects.filter(pk__in=ids).update(status=status)
+
+    _notify_delivered(
+        [(order_id, user_id) for order_id, (status, user_id) in changed.items() if status == 'Delivered'],
+        dispatcher,
+    )
+    return {order_id: status for order_id, (status, _) in changed.items()}
+
+
+@transaction.atomic
+def set_line_status(farmer_order, status):
+    """
+    Move one FarmerOrder to `status` and update its order; returns the
+    order's status afterwards. Raises InvalidTransition.
+    """
+    if status not in LINE_TRANSITIONS.get(farmer_order.status, ()):
+        raise InvalidTransition(farmer_order.status, status)
+    order_id = farmer_order.order_item.order_id
+    list(Order.objects.select_for_update().filter(pk=order_id).values_list('id'))  # serialise with whole-order moves
+    # Conditional on the state we validated, in case someone else moved it first
+    moved = FarmerOrder.objects.filter(pk=farmer_order.pk, status=farmer_order.status).update(
+        status=status, updated_at=timezone.now(),
+    )
+    if not moved:
+        farmer_order.refresh_from_db(fields=['status'])
+        raise InvalidTransition(farmer_order.status, status)
+
+    old = farmer_order.status
+    farmer_order.status = status
+    item = farmer_order.order_item
+    analytics.lines_moved([(farmer_order.farmer_id, item.price * item.quantity)], status)
+    if status == 'Delivered':
+        ledger.record_deliveries([item.id])
+    changed = move_lines({order_id: 1}, old, status)
+    # .update() skips post_save, so notify the customer like the signal does
+    enqueue('farmer_order_status_changed', farmer_order_id=farmer_order.pk, status=status)
+    return changed.get(order_id) or Order.objects.values_list('status', flat=True).get(pk=order_id)
+
+
+@transaction.atomic
+def set_lines_status(farmer, line_ids, status):
+    """
+    Move many of `farmer`'s FarmerOrders to `status` (the order queue's bulk
+    action); returns the ids that moved.
+
+    Lines that cannot make the transition are skipped. However many lines,
+    this is one locked SELECT, one UPDATE for the lines, one move_lines()
+    per state they left and one bulk_create of the customers'
+    notifications, instead of a job per line.
+    """
+    sources = [current for current, targets in LINE_TRANSITIONS.items() if status in targets]
+    lines = FarmerOrder.objects.filter(farmer=farmer, pk__in=list(line_ids), status__in=sources)
+    # Parent orders first, in id order, like set_line_status and transition_orders
+    list(
+        Order.objects.select_for_update()
+        .filter(pk__in=lines.values('order_item__order_id')).order_by('id').values_list('id')
+    )
+    rows = list(
+        lines.select_for_update(of=('self',)).annotate(total=analytics.line_total())
+        .values(
+            'id', 'status', 'order_item_id', 'total', 'order_item__order_id',
+            'order_item__order__user_id', 'order_item__product__name',
+        )
+    )
+    if not rows:
+        return []
+    ids = [row['id'] for row in rows]
+    FarmerOrder.objects.filter(pk__in=ids).update(status=status, updated_at=timezone.now())
+
+    analytics.lines_moved([(farmer.pk, row['total']) for row in rows], status)
+    if status == 'Delivered':
+        ledger.record_deliveries([row['order_item_id'] for row in rows])
+    by_state = defaultdict(Counter)
+    with Dispatcher() as dispatcher:
+        for row in rows:
+            order_id = row['order_item__order_id']
+            by_state[row['status']][order_id] += 1
+            dispatcher.add(
+                row['order_item__order__user_id'], 'line_status', order_id, 'farmer_order', row['id'],
+                row['order_item__product__name'], variant=status,
+            )
+        for old, moves in by_state.items():
+            move_lines(moves, old, status, dispatcher)
+    return ids
+
+
+@transaction.atomic
+def transition_orders(order_ids, status, dispatcher=None):
+    """
+    Move whole orders to `status` with all their lines that are behind it.
+
+    Orders that cannot make the transition from their current status are
+    skipped. Returns the ids that moved. Per state this is one UPDATE for
+    the lines and one for the orders, however many orders and lines;
+    customers of delivered orders are notified as in move_lines().
+    """
+    sources = [current for current, targets in ORDER_TRANSITIONS.items() if status in targets]
+    due = list(
+        Order.objects.select_for_update()
+        .filter(pk__in=order_ids, status__in=sources)
+        .values_list('id', 'user_id')
+    )
+    ids = [order_id for order_id, _ in due]
+    if not ids:
+        return ids
+
+    behind = LINES_BEHIND[status]
+    lines = FarmerOrder.objects.filter(order_item__order_id__in=ids, status__in=behind)
+    if status in analytics.STATUS_FIELDS:
+        moving = list(lines.annotate(total=analytics.line_total()).values_list('farmer_id', 'total', 'order_item_id'))
+        analytics.lines_moved([(farmer_id, total) for farmer_id, total, _ in moving], status)
+        if status == 'Delivered':
+            ledger.record_deliveries([item_id for _, _, item_id in moving])
+    lines.update(status=status, updated_at=timezone.now())
+    target = COUNTERS[status]
+    counters = {COUNTERS[state]: 0 for state in behind}
+    counters[target] = F(target)
+    for state in behind:
+        counters[target] += F(COUNTERS[state])
+    # Each allowed transition leaves every active line at `status` or
+    # beyond it, so the derived status is `status` itself.
+    Order.objects.filter(pk__in=ids).update(status=status, **counters)
+    if status == 'Delivered':
+        _notify_delivered(due, dispatcher)
+    return ids
+
+
+def transition_order(order, status):
+    """Validated move of one order (admin actions, customer cancel)."""
+    if not can_transition(order.status, status):
+        raise InvalidTransition(order.status, status)
+    if not transition_orders([order.pk], status):
+        order.refresh_from_db(fields=['status'])
+        raise InvalidTransition(order.status, status)
+    order.status = status
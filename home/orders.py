@@ -0,0 +1,208 @@
+"""
+Order placement.
+
+place_order() is the only write path for a new order: the order, its items,
+the per-farmer FarmerOrder/FarmerPayment rows, stock and the follow-up job
+for notifications and stock alerts are written in one transaction with a
+fixed number of bulk statements, however many lines the cart has.
+
+Stock is reserved by locking the order's products and taking it with one
+conditional UPDATE (stock = stock - n WHERE stock >= n), so concurrent
+checkouts can never oversell. Each line gets a StockReservation. Methods in
+HOLD_UNTIL_PAID hold it until a verified payment confirmation commits it
+(commit_reservations) or it expires (release_expired_reservations); every
+other method commits it at once. Cancelling an order gives the stock back.
+The locked read gives each product's new stock, from which
+home/stock_alerts.py raises low-stock alerts without reading it again.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import (
+    CheckoutToken, FarmerOrder, FarmerPayment, Order, OrderItem, Product, StockReservation,
+)
+from . import analytics, stock_alerts
+from .jobs import enqueue
+
+RESERVATION_TTL = timedelta(minutes=15)
+# Payment methods whose stock is held until a verified payment confirmation
+# calls commit_reservations(). None yet: the card, netbanking and UPI pages
+# are placeholders with no gateway callback, so those orders commit at
+# placement like cash on delivery rather than expiring unpaid.
+HOLD_UNTIL_PAID = frozenset()
+ACTIVE_RESERVATIONS = ('Held', 'Committed')
+
+
+class OutOfStock(Exception):
+    def __init__(self, products):
+        self.products = products
+        super().__init__(", ".join(p.name for p in products))
+
+
+def format_address(address):
+    return (
+        f"{address.full_name}, {address.address_line}, {address.city}, "
+        f"{address.state}, {address.pincode} | Phone: {address.phone}"
+    )
+
+
+@transaction.atomic
+def place_order(user, address, payment_method, priced, checkout_token=None):
+    """
+    Create an Order from a PricedCart (see home/cart.py) and return it.
+
+    Raises OutOfStock, with nothing written, if any line cannot be reserved.
+    With a checkout_token, a concurrent submit of the same token raises
+    IntegrityError on the token's unique key and rolls its order back.
+    """
+    quantities = _quantities(priced.lines)
+    stock_rows = _reserve_stock(quantities)
+    low_stock = stock_alerts.crossed(stock_rows, quantities)
+
+    order = Order.objects.create(
+        user=user,
+        address=format_address(address),
+        payment_method=payment_method,
+        total_amount=priced.grand_total,
+        lines_pending=len(priced.lines),  # one FarmerOrder per line
+    )
+
+    items = OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=line.product, quantity=line.quantity, price=line.product.price)
+        for line in priced.lines
+    ])
+
+    FarmerOrder.objects.bulk_create([
+        FarmerOrder(farmer_id=item.product.user_id, order_item=item, status=order.status)
+        for item in items
+    ])
+    FarmerPayment.objects.bulk_create([
+        FarmerPayment(farmer_id=line.product.user_id, order_item=item, amount=line.total, status='Pending')
+        for item, line in zip(items, priced.lines)
+    ])
+    analytics.lines_placed((line.product.user_id, line.total) for line in priced.lines)
+
+
+    if payment_method in HOLD_UNTIL_PAID:
+        status, expires_at = 'Held', timezone.now() + RESERVATION_TTL
+    else:
+        status, expires_at = 'Committed', None
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=pk, quantity=qty, status=status, expires_at=expires_at)
+        for pk, qty in quantities.items()
+    ])
+
+    # Notifications, including for the stock alerts just raised, are written
+    # by the 'order_placed' job, which is committed with the order (home/jobs.py).
+    enqueue('order_placed', order_id=order.id, low_stock=low_stock)
+
+    if checkout_token:
+        CheckoutToken.objects.create(key=checkout_token, user=user, order=order)
+    return order
+
+
+def replayed_order(user, checkout_token):
+    """The order already placed with this token, if any (one indexed read)."""
+    token = CheckoutToken.objects.select_related('order').filter(key=checkout_token, user=user).first()
+    return token.order if token else None
+
+
+def _quantities(lines):
+    quantities = {}
+    for line in lines:
+        quantities[line.product.pk] = quantities.get(line.product.pk, 0) + line.quantity
+    return quantities
+
+
+def _per_product(quantities):
+    return Case(
+        *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _reserve_stock(quantities):
+    # Lock the products (row locks; on SQLite the IMMEDIATE transaction
+    # already holds the write lock), check them, then take the stock with
+    # one conditional UPDATE (`stock >= n`) whose row count must match, so
+    # two workers can never both take the last unit. If any product is
+    # short, nothing is written. Returns (product_id, user_id, new stock,
+    # threshold) per product for stock_alerts.crossed().
+    rows = list(
+        Product.objects.select_for_update().filter(pk__in=quantities).order_by('pk')
+        .values_list('id', 'user_id', 'stock', 'low_stock_threshold')
+    )
+    short = [pk for pk, _, stock, _ in rows if stock < quantities[pk]]
+    if short or len(rows) != len(quantities):
+        raise OutOfStock(list(Product.objects.filter(pk__in=short)))
+    needed = _per_product(quantities)
+    taken = Product.objects.filter(pk__in=quantities, stock__gte=needed).update(stock=F('stock') - needed)
+    if taken != len(quantities):
+        raise OutOfStock(list(Product.objects.filter(pk__in=quantities, stock__lt=needed)))
+    return [(pk, user_id, stock - quantities[pk], threshold) for pk, user_id, stock, threshold in rows]
+
+
+def _restock(quantities):
+    if quantities:
+        Product.objects.filter(pk__in=quantities).update(stock=F('stock') + _per_product(quantities))
+        stock_alerts.restocked(quantities)
+
+
+def commit_reservations(order):
+    """Verified payment confirmation only: held stock stays sold."""
+    return StockReservation.objects.filter(order=order, status='Held').update(status='Committed', expires_at=None)
+
+
+@transaction.atomic
+def release_reservations(order_id, product_ids=None):
+    """
+    Return an order's reserved stock (only for `product_ids`, if given);
+    safe to call twice or concurrently.
+    """
+    quantities = {}
+    rows = StockReservation.objects.filter(order_id=order_id, status__in=ACTIVE_RESERVATIONS)
+    if product_ids is not None:
+        rows = rows.filter(product_id__in=product_ids)
+    for reservation in rows.values('id', 'product_id', 'quantity'):
+        # Claim each row with a conditional UPDATE so only one caller restocks it
+        if StockReservation.objects.filter(id=reservation['id'], status__in=ACTIVE_RESERVATIONS).update(status='Released'):
+            quantities[reservation['product_id']] = quantities.get(reservation['product_id'], 0) + reservation['quantity']
+    _restock(quantities)
+    return quantities
+
+
+@transaction.atomic
+def cancel_order(order):
+    """
+    Cancel an order that has not shipped yet, with all its lines, and
+    release its stock. Returns False if it can no longer be cancelled.
+    """
+    from .order_status import InvalidTransition, transition_order
+
+    try:
+        transition_order(order, 'Cancelled')
+    except InvalidTransition:
+        return False
+    release_reservations(order.pk)
+    return True
+
+
+def release_expired_reservations(now=None):
+    """Cancel orders whose online payment was abandoned; returns how many."""
+    now = now or timezone.now()
+    order_ids = (
+        StockReservation.objects.filter(status='Held', expires_at__lt=now)
+        .values_list('order_id', flat=True).distinct()
+    )
+    cancelled = 0
+    for order in Order.objects.filter(pk__in=list(order_ids)):
+        if cancel_order(order):
+            cancelled += 1
+        else:
+            # Already shipped/cancelled by someone else: just drop the hold
+            StockReservation.objects.filter(order=order, status='Held').update(status='Committed', expires_at=None)
+    return cancelled
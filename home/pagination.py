@@ -0,0 +1,132 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorPage:
+    """One page of a CursorPaginator; iterates like a list of objects."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over a queryset.
+
+    `ordering` lists the fields the page is sorted by, e.g. ['price', 'id'] or
+    ['-created_at', '-id']; the last one must be unique so every row has a
+    distinct position. Pages are fetched with a WHERE on the last row seen
+    instead of OFFSET, and no COUNT(*) is ever issued, so page N costs the
+    same as page 1. Cursors are opaque url-safe tokens.
+    """
+
+    def __init__(self, queryset, ordering, per_page=10):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+
+    def get_page(self, cursor=None):
+        """Like Paginator.get_page(): a bad cursor falls back to the first page."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
+
+    def page(self, cursor=None):
+        values, backwards = self.decode(cursor) if cursor else (None, False)
+
+        ordering = [self._flip(f) for f in self.ordering] if backwards else self.ordering
+        qs = self.queryset.order_by(*ordering)
+        if values is not None:
+            qs = qs.filter(self._after(ordering, values))
+
+        rows = list(qs[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return CursorPage([])
+
+        first, last = self.encode(rows[0], True), self.encode(rows[-1], False)
+        if backwards:
+            return CursorPage(rows, next_cursor=last, previous_cursor=first if has_more else None)
+        return CursorPage(rows, next_cursor=last if has_more else None, previous_cursor=first if values is not None else None)
+
+    # -- cursor encoding ------------------------------------------------
+
+    def encode(self, obj, backwards):
+        values = [self._field_value(obj, f.lstrip('-')) for f in self.ordering]
+        payload = json.dumps({'v': values, 'b': int(backwards)}, separators=(',', ':'), default=str)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            raw, backwards = payload['v'], bool(payload['b'])
+            if len(raw) != len(self.ordering):
+                raise InvalidCursor(cursor)
+            values = [self._to_python(f.lstrip('-'), value) for f, value in zip(self.ordering, raw)]
+        except (ValueError, KeyError, TypeError, ValidationError) as e:
+            raise InvalidCursor(cursor) from e
+        return values, backwards
+
+    # -- helpers --------------------------------------------------------
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def _after(ordering, values):
+        """Rows strictly after `values` in `ordering` (row-value comparison spelled out)."""
+        condition = Q()
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = f'{name}__lt' if field.startswith('-') else f'{name}__gt'
+            step = Q(**{lookup: values[i]})
+            for prev_field, prev_value in zip(ordering[:i], values[:i]):
+                step &= Q(**{prev_field.lstrip('-'): prev_value})
+            condition |= step
+        return condition
+
+    @staticmethod
+    def _field_value(obj, name):
+        value = getattr(obj, name)
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+
+    def _to_python(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = self.queryset.query.annotations[name].output_field
+        return field.to_python(value)
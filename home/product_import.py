@@ -0,0 +1,219 @@
+"""
+Bulk product import.
+
+A farmer uploads a CSV with one product per row and, optionally, a zip of
+the images the rows name (a row without an image makes a product without
+one, as ProductForm allows).
+The 'import_products' job, or `manage.py import_products`, streams the
+CSV one row at a time. Each row is:
+- validated with ProductImportForm's fields, the same rules as
+  ProductForm, built once rather than a bound form per row
+- given its category from a name map loaded once
+- given its image, read from the archive on its own and written to
+  storage straight away (deleted again if its batch does not commit)
+Valid rows are written with bulk_create in batches of BATCH_SIZE. Memory
+stays flat however long the file is: only the current batch, the category
+map and the zip's directory are held.
+
+Each batch commits on its own, together with its search postings, stock
+alerts, image derivative jobs and the import's progress counters. The
+imports page therefore shows progress while the import runs, and a retried
+job resumes after the last committed row.
+"""
+import csv
+import io
+import posixpath
+import zipfile
+from contextlib import contextmanager
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import catalog_cache, stock_alerts
+from .forms import ProductImportForm
+from .jobs import enqueue_many
+from .models import Category, Product, ProductImport
+from .search import index_new_products
+
+BATCH_SIZE = 500
+MAX_ERRORS = 100
+MAX_IMAGE_SIZE = 5 * 1024 * 1024  # uncompressed, checked before an image is read
+COLUMNS = ['name', 'price', 'details', 'category', 'unit', 'stock', 'low_stock_threshold', 'image']
+REQUIRED_COLUMNS = {'name', 'price', 'details'}
+# Optional columns left empty get the model default
+DEFAULTS = {field: Product._meta.get_field(field).default for field in ('unit', 'stock', 'low_stock_threshold')}
+# Validators only, shared by every row: binding a form per row would
+# deep-copy them each time. ProductForm has no clean_<field>() hooks.
+FIELDS = ProductImportForm.base_fields
+
+
+class ImportTakenOver(Exception):
+    """Another runner committed a batch of this import first."""
+
+
+def category_map():
+    """{lower-cased category name: Category}, read once per import."""
+    return {category.name.strip().lower(): category for category in Category.objects.all()}
+
+
+def clean_row(data, files):
+    """(cleaned data, errors) of one row, as ProductImportForm would validate it."""
+    cleaned, errors = {}, []
+    for name, field in FIELDS.items():
+        value = files.get(name) if isinstance(field, forms.FileField) else data.get(name)
+        try:
+            cleaned[name] = field.clean(value)
+        except ValidationError as e:
+            errors.append(f"{name}: {' '.join(e.messages)}")
+    return cleaned, errors
+
+
+def run(product_import, batch_size=BATCH_SIZE, progress=None):
+    """
+    Import `product_import`, or resume it after its last committed batch.
+    progress(product_import) is called after every batch.
+    """
+    ProductImport.objects.filter(pk=product_import.pk).update(status='Running')
+    categories = category_map()
+    resume_after = product_import.rows_read
+    products, errors = [], []
+    try:
+        with product_import.csv_file.open('rb') as raw, _archive(product_import.images) as archive:
+            reader = csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+            missing = REQUIRED_COLUMNS - set(reader.fieldnames or ())
+            if missing:
+                return _finish(product_import, 'Failed', [1, f"Missing columns: {', '.join(sorted(missing))}"])
+
+            for row_number, row in enumerate(reader, start=1):
+                if row_number <= resume_after:
+                    continue
+                product, error = _product(row, product_import.farmer_id, categories, archive)
+                if error:
+                    errors.append([row_number + 1, error])  # +1: the header is line 1
+                else:
+                    products.append(product)
+                if len(products) + len(errors) >= batch_size:
+                    _commit(product_import, products, errors)
+                    products, errors = [], []
+                    if progress:
+                        progress(product_import)
+            _commit(product_import, products, errors)
+            products = []
+    except ImportTakenOver:
+        return product_import
+    except (csv.Error, UnicodeDecodeError, zipfile.BadZipFile) as e:
+        return _finish(product_import, 'Failed', [product_import.rows_read + 2, str(e)])
+    except Exception as e:
+        # Database or storage trouble: never leave the import 'Running'. The
+        # job is retried and resumes after the last committed batch.
+        _finish(product_import, 'Failed', [product_import.rows_read + 2, f"{type(e).__name__}: {e}"])
+        raise
+    finally:
+        # Images of a batch that never committed; a retry writes them again
+        _discard_images(products)
+    if progress:
+        progress(product_import)
+    return _finish(product_import, 'Done')
+
+
+@contextmanager
+def _archive(fieldfile):
+    if not fieldfile:
+        yield None
+        return
+    with fieldfile.open('rb') as raw, zipfile.ZipFile(raw) as archive:
+        yield archive
+
+
+def _read_image(archive, name):
+    """(uploaded file, error) for one archive member; (None, None) for a row without an image."""
+    if not name:
+        return None, None
+    if archive is None:
+        return None, "no image archive was uploaded"
+    try:
+        info = archive.getinfo(name)
+    except KeyError:
+        return None, f"image {name!r} is not in the archive"
+    if info.file_size > MAX_IMAGE_SIZE:
+        return None, f"image {name!r} is larger than {MAX_IMAGE_SIZE // (1024 * 1024)} MB"
+    return SimpleUploadedFile(posixpath.basename(name), archive.read(info)), None
+
+
+def _product(row, farmer_id, categories, archive):
+    """(unsaved Product, None) for a valid row, else (None, error message)."""
+    data = {column: (row.get(column) or '').strip() for column in COLUMNS}
+    for field, default in DEFAULTS.items():
+        data[field] = data[field] or default
+
+    category = data['category'].lower()
+    if category and category not in categories:
+        return None, f"unknown category {data['category']!r}"
+    image, error = _read_image(archive, data['image'])
+    if error:
+        return None, error
+
+    cleaned, errors = clean_row(data, {'image': image})
+    if errors:
+        return None, "; ".join(errors)
+    image = cleaned.pop('image')
+    product = Product(user_id=farmer_id, ctgry=categories.get(category), **cleaned)
+    if image:
+        # Written now so the batch only holds file names, not image bytes
+        product.image.save(image.name, image, save=False)
+    return product, None
+
+
+@transaction.atomic
+def _commit(product_import, products, errors):
+    rows = len(products) + len(errors)
+    if not rows:
+        return
+    # Conditional on the progress this runner last saw, so a second runner
+    # (a job reclaimed after the lock timeout) stops instead of importing
+    # the same rows twice.
+    claimed = ProductImport.objects.filter(pk=product_import.pk, rows_read=product_import.rows_read).update(
+        rows_read=F('rows_read') + rows,
+        created=F('created') + len(products),
+        failed=F('failed') + len(errors),
+    )
+    if not claimed:
+        raise ImportTakenOver(product_import.pk)
+
+    # bulk_create skips the Product signals; do their work once per batch
+    Product.objects.bulk_create(products)
+    index_new_products(products)
+    stock_alerts.products_added(products)
+    enqueue_many('build_image_derivatives', [
+        {'model': 'home.Product', 'pk': product.pk, 'field': 'image'} for product in products if product.image
+    ])
+    scopes = {catalog_cache.category_scope(product.ctgry_id) for product in products} | {catalog_cache.ALL}
+    transaction.on_commit(lambda: catalog_cache.bump(*scopes))
+
+    if errors and len(product_import.errors) < MAX_ERRORS:
+        product_import.errors = (product_import.errors + errors)[:MAX_ERRORS]
+        ProductImport.objects.filter(pk=product_import.pk).update(errors=product_import.errors)
+    product_import.rows_read += rows
+    product_import.created += len(products)
+    product_import.failed += len(errors)
+
+
+def _discard_images(products):
+    for product in products:
+        if product.image:
+            product.image.delete(save=False)
+
+
+def _finish(product_import, status, error=None):
+    if error:
+        product_import.errors = (product_import.errors + [error])[:MAX_ERRORS + 1]
+    product_import.status = status
+    product_import.finished_at = timezone.now()
+    ProductImport.objects.filter(pk=product_import.pk).update(
+        status=status, finished_at=product_import.finished_at, errors=product_import.errors,
+    )
+    return product_import
@@ -0,0 +1,85 @@
+"""
+Notification retention.
+
+Only read notifications (created at or before the user's read watermark)
+are ever removed:
+
+- everything older than NOTIFICATION_RETENTION_DAYS, and
+- for users above NOTIFICATION_MAX_PER_USER, everything older than their
+  newest NOTIFICATION_MAX_PER_USER.
+
+Rows go in chunks of `chunk_size` by primary key, each chunk in its own
+short transaction, so the table is never locked for long. With an archive
+each chunk is first appended to a gzip-compressed JSON Lines file, one
+object per notification.
+"""
+import gzip
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Notification
+
+CHUNK_SIZE = 2000
+ARCHIVE_FIELDS = ('id', 'user_id', 'event_type', 'related_type', 'related_id', 'dedup_key', 'message', 'created_at')
+
+
+def retention_days():
+    return getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+
+
+def max_per_user():
+    return getattr(settings, 'NOTIFICATION_MAX_PER_USER', 500)
+
+
+def read_notifications():
+    return Notification.objects.filter(user__notification_watermark__last_read_at__gte=F('created_at'))
+
+
+def prune(days=None, cap=None, archive=None, chunk_size=CHUNK_SIZE, now=None):
+    """Apply both rules; returns {'expired': rows, 'over_cap': rows}."""
+    days = retention_days() if days is None else days
+    cap = max_per_user() if cap is None else cap
+    now = now or timezone.now()
+
+    removed = {'expired': _purge(read_notifications().filter(created_at__lt=now - timedelta(days=days)),
+                                 archive, chunk_size)}
+    removed['over_cap'] = 0
+    over_cap = (
+        Notification.objects.values('user_id').annotate(n=Count('id'))
+        .filter(n__gt=cap).values_list('user_id', flat=True)
+    )
+    for user_id in over_cap:
+        # created_at of the oldest notification this user keeps
+        keep_from = (
+            Notification.objects.filter(user_id=user_id)
+            .order_by('-created_at', '-id').values_list('created_at', flat=True)[cap - 1]
+        )
+        removed['over_cap'] += _purge(
+            read_notifications().filter(user_id=user_id, created_at__lt=keep_from), archive, chunk_size,
+        )
+    return removed
+
+
+def _purge(queryset, archive, chunk_size):
+    total = last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.filter(id__gt=last_id).order_by('id').values(*ARCHIVE_FIELDS)[:chunk_size])
+            if not rows:
+                return total
+            if archive is not None:
+                _append(archive, rows)
+            Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        total += len(rows)
+        last_id = rows[-1]['id']
+
+
+def _append(path, rows):
+    with gzip.open(path, 'at', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
@@ -0,0 +1,137 @@
+import re
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+
+from .models import Product, ProductSearchTerm
+
+# Field weights used for ranking: a hit in the name beats a hit in the category,
+# which beats a hit somewhere in the description.
+NAME_WEIGHT = 10
+CATEGORY_WEIGHT = 5
+DETAILS_WEIGHT = 1
+
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 50
+MAX_QUERY_TERMS = 5
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lower-case word tokens of `text`, truncated to fit the index column."""
+    if not text:
+        return []
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(text.lower())
+        if len(token) >= MIN_TERM_LENGTH
+    ]
+
+
+def build_postings(product):
+    """Return {term: weight} for a product's name, category and details."""
+    postings = {}
+    fields = [
+        (product.name, NAME_WEIGHT),
+        (product.ctgry.name if product.ctgry_id else '', CATEGORY_WEIGHT),
+        (product.details, DETAILS_WEIGHT),
+    ]
+    for text, weight in fields:
+        for term in tokenize(text):
+            postings[term] = postings.get(term, 0) + weight
+    return postings
+
+
+def index_product(product):
+    """Replace the postings of a single product."""
+    postings = build_postings(product)
+    with transaction.atomic():
+        ProductSearchTerm.objects.filter(product=product).delete()
+        ProductSearchTerm.objects.bulk_create([
+            ProductSearchTerm(term=term, product=product, weight=weight)
+            for term, weight in postings.items()
+        ])
+
+
+def index_products(products, batch_size=500):
+    """Re-index many products; returns the number of postings written."""
+    written = 0
+    batch, product_ids = [], []
+    for product in products.select_related('ctgry').iterator(chunk_size=batch_size):
+        product_ids.append(product.id)
+        batch.extend(
+            ProductSearchTerm(term=term, product=product, weight=weight)
+            for term, weight in build_postings(product).items()
+        )
+        if len(product_ids) >= batch_size:
+            written += _flush(product_ids, batch, batch_size)
+            batch, product_ids = [], []
+    if product_ids:
+        written += _flush(product_ids, batch, batch_size)
+    return written
+
+
+def index_new_products(products, batch_size=500):
+    """Postings for products just created with bulk_create (ctgry loaded); nothing to replace."""
+    ProductSearchTerm.objects.bulk_create(
+        [
+            ProductSearchTerm(term=term, product=product, weight=weight)
+            for product in products
+            for term, weight in build_postings(product).items()
+        ],
+        batch_size=batch_size,
+    )
+
+
+def _flush(product_ids, batch, batch_size):
+    with transaction.atomic():
+        ProductSearchTerm.objects.filter(product_id__in=product_ids).delete()
+        ProductSearchTerm.objects.bulk_create(batch, batch_size=batch_size)
+    return len(batch)
+
+
+def _prefix(term):
+    # A range instead of `startswith`: SQLite's LIKE is case-insensitive and
+    # cannot use the (term, product) index, a plain range comparison can.
+    return Q(term__gte=term, term__lt=term + '\uffff')
+
+
+def search_products(query, products=None):
+    """
+    Rank `products` (default: the whole catalog) against `query`.
+
+    Every query word must match the start of an indexed word ("tom" finds
+    "tomato"). Results are ordered by summed field weight, newest first on ties.
+    """
+    if products is None:
+        products = Product.objects.all()
+
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        # Still annotated, so callers can order by relevance ("t", "!!")
+        return products.annotate(search_score=Value(0, output_field=IntegerField())).none()
+
+    any_term = Q()
+    for term in terms:
+        any_term |= _prefix(term)
+
+    # One group per product, with a 0/1 flag per query word so that only
+    # products matching all of them survive.
+    flags = {
+        f'hit{i}': Max(Case(When(_prefix(term), then=Value(1)), default=Value(0), output_field=IntegerField()))
+        for i, term in enumerate(terms)
+    }
+    matches = (
+        ProductSearchTerm.objects.filter(any_term)
+        .values('product_id')
+        .annotate(score=Sum('weight'), **flags)
+        .filter(**{name: 1 for name in flags})
+    )
+
+    score = matches.filter(product_id=OuterRef('pk')).values('score')[:1]
+    return (
+        products.filter(id__in=matches.values('product_id'))
+        .annotate(search_score=Subquery(score))
+        .order_by('-search_score', '-created_at')
+    )
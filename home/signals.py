@@ -1,64 +1,102 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import OrderItem, FarmerOrder, FarmerPayment, Notification, StockAlert, Product
+from .models import FarmerOrder, Product, Category, Review
+from .search import index_product, index_products
+from . import catalog_cache, stock_alerts
+from .images import has_derivatives
+from .jobs import enqueue
 
-@receiver(post_save, sender=OrderItem)
-def create_farmer_records(sender, instance, created, **kwargs):
-    if created:
-        product = instance.product
-        farmer = product.user  # Farmer who owns the product
-        quantity = instance.quantity
-        total_amount = instance.price * quantity
-
-        # 1️⃣ Create FarmerOrder
-        FarmerOrder.objects.create(
-            farmer=farmer,
-            order_item=instance,
-            status=instance.order.status  # Sync initial status
-        )
-
-        # 2️⃣ Create FarmerPayment
-        FarmerPayment.objects.create(
-            farmer=farmer,
-            order_item=instance,
-            amount=total_amount,
-            status='Pending'
-        )
-
-        # 3️⃣ Create Notification for new order
-        Notification.objects.create(
-            user=farmer,
-            message=f"New order for {product.name} ({quantity} pcs)."
-        )
-
-        # 4️⃣ Check stock alert
-        if product.stock - quantity <= 5:  # Threshold can be adjusted
-            StockAlert.objects.get_or_create(
-                product=product,
-                user=farmer,
-                threshold=5,
-                defaults={'is_alerted': False}
-            )
-
-        # Optionally reduce product stock automatically
-        product.stock -= quantity
-        product.save()
+# New orders: FarmerOrder/FarmerPayment rows and stock are written by
+# home.orders.place_order, notifications by its 'order_placed' job.
 
 @receiver(post_save, sender=FarmerOrder)
 def notify_customer_on_status_change(sender, instance, created, **kwargs):
     if not created:  # Only on updates
-        customer = instance.order_item.order.user
-        message = f"Your order for {instance.order_item.product.name} is now {instance.status}."
-        Notification.objects.create(
-            user=customer,
-            message=message
-        )
-
-@receiver(post_save, sender=OrderItem)
-def notify_customer_on_new_order(sender, instance, created, **kwargs):
+        enqueue('farmer_order_status_changed', farmer_order_id=instance.id, status=instance.status)
+
+# -----------------------------
+# Search index sync
+# -----------------------------
+# Postings are removed by the ProductSearchTerm FK cascade on delete.
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, **kwargs):
+    index_product(instance)
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    if not created:  # a renamed category changes its products' postings
+        index_products(Product.objects.filter(ctgry=instance))
+
+
+# -----------------------------
+# Stock alerts
+# -----------------------------
+# Checkout and restocks use .update() and keep alerts in step themselves
+# (home/orders.py); this covers edits and admin saves.
+@receiver(post_save, sender=Product)
+def sync_stock_alert(sender, instance, **kwargs):
+    stock_alerts.product_saved(instance)
+
+
+# -----------------------------
+# Rating aggregates
+# -----------------------------
+def _apply_rating(review, sign):
+    stars = int(review.rating)
+    bucket = f'rating_{stars}'
+    # Runs inside the caller's transaction, so the aggregate commits (or rolls
+    # back) together with the review row.
+    Product.objects.filter(pk=review.product_id).update(**{
+        'rating_count': F('rating_count') + sign,
+        'rating_sum': F('rating_sum') + sign * stars,
+        bucket: F(bucket) + sign,
+    })
+
+@receiver(post_save, sender=Review)
+def add_review_to_rating(sender, instance, created, **kwargs):
     if created:
-        customer = instance.order.user
-        Notification.objects.create(
-            user=customer,
-            message=f"Your order for {instance.product.name} x {instance.quantity} has been placed successfully!"
-        )
+        _apply_rating(instance, 1)
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_rating(sender, instance, **kwargs):
+    _apply_rating(instance, -1)
+
+
+# -----------------------------
+# Catalog listing cache generations
+# -----------------------------
+# Bumped after commit so a concurrent reader cannot re-cache pre-commit rows
+# under the new generation.
+def _bump_after_commit(*scopes):
+    transaction.on_commit(lambda: catalog_cache.bump(*scopes))
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_listings(sender, instance, **kwargs):
+    _bump_after_commit(
+        catalog_cache.ALL,
+        catalog_cache.category_scope(instance.ctgry_id),
+        catalog_cache.category_scope(getattr(instance, '_loaded_ctgry_id', None)),
+    )
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_listings(sender, instance, **kwargs):
+    _bump_after_commit('categories', catalog_cache.ALL, catalog_cache.category_scope(instance.pk))
+
+
+# -----------------------------
+# Image derivatives
+# -----------------------------
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def build_catalog_image_derivatives(sender, instance, **kwargs):
+    if instance.image and not has_derivatives(instance.image.name):
+        enqueue('build_image_derivatives', model=sender._meta.label, pk=instance.pk, field='image')
+
+@receiver(post_save, sender=Review)
+def build_review_image_derivatives(sender, instance, **kwargs):
+    if instance.review_image and not has_derivatives(instance.review_image.name):
+        enqueue('build_image_derivatives', model='home.Review', pk=instance.pk, field='review_image')
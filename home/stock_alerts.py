@@ -0,0 +1,94 @@
+"""
+Low-stock alerts.
+
+Every product has its own low_stock_threshold, and StockAlert is the
+precomputed set of products at or below it: one row per product, written
+when stock crosses the threshold and removed when it recovers. The alerts
+page and the dashboard read that set and never look at stock levels.
+
+Checkout learns each product's new stock from the locked read that
+precedes the decrement (orders._reserve_stock returns it), so crossed()
+finds the products that just went from above their threshold to at or
+below it without another read; the order_placed job then notifies the
+farmer. Restocks and product edits drop alerts that no longer apply, and
+bulk imports raise alerts for products that start out low. reevaluate()
+(`manage.py reevaluate_stock_alerts`) rebuilds the set from one query on
+the (stock - threshold) expression index, e.g. after thresholds were
+changed in bulk.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import Product, StockAlert
+
+# Same expression as Product's product_stock_margin_idx, so the index applies
+STOCK_MARGIN = F('stock') - F('low_stock_threshold')
+
+
+def low_stock():
+    """Products at or below their threshold."""
+    return Product.objects.alias(margin=STOCK_MARGIN).filter(margin__lte=0)
+
+
+def crossed(rows, quantities):
+    """
+    Raise alerts for the products a stock decrement took across their
+    threshold; returns their ids.
+
+    rows: (product_id, user_id, new stock, threshold) as returned by
+    orders._reserve_stock(); quantities: {product_id: units taken}.
+    """
+    alerts = [
+        StockAlert(product_id=pk, user_id=user_id, threshold=threshold)
+        for pk, user_id, stock, threshold in rows
+        if stock <= threshold < stock + quantities[pk]
+    ]
+    StockAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+    return [alert.product_id for alert in alerts]
+
+
+def restocked(product_ids):
+    """Drop the alerts of these products that are back above their threshold."""
+    return StockAlert.objects.filter(
+        product_id__in=list(product_ids), product__stock__gt=F('product__low_stock_threshold'),
+    ).delete()[0]
+
+
+def product_saved(product):
+    """Bring one product's alert in line with the values it was just saved with."""
+    # Views assign the raw POST strings, which save() does not convert back
+    stock, threshold = int(product.stock), int(product.low_stock_threshold)
+    if stock <= threshold:
+        StockAlert.objects.bulk_create(
+            [StockAlert(product=product, user_id=product.user_id, threshold=threshold)],
+            ignore_conflicts=True,
+        )
+    else:
+        StockAlert.objects.filter(product=product).delete()
+
+
+def products_added(products):
+    """Alerts for new products that start at or below their threshold (bulk imports)."""
+    StockAlert.objects.bulk_create(
+        [
+            StockAlert(product_id=product.pk, user_id=product.user_id, threshold=product.low_stock_threshold)
+            for product in products if product.stock <= product.low_stock_threshold
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@transaction.atomic
+def reevaluate():
+    """Rebuild the alert set from current stock; returns (raised, cleared)."""
+    low = low_stock()
+    cleared = StockAlert.objects.exclude(product__in=low.values('id')).delete()[0]
+    missing = low.exclude(id__in=StockAlert.objects.values('product_id'))
+    raised = StockAlert.objects.bulk_create(
+        [
+            StockAlert(product_id=pk, user_id=user_id, threshold=threshold)
+            for pk, user_id, threshold in missing.values_list('id', 'user_id', 'low_stock_threshold')
+        ],
+        ignore_conflicts=True,
+    )
+    return len(raised), cleared
@@ -1,18 +1,131 @@
+import logging
+from collections import Counter
 from datetime import timedelta
+from django.apps import apps
+from django.db import transaction
 from django.utils import timezone
-from .models import FarmerOrder, Notification
-
-def auto_update_delivered_orders():
-    now = timezone.now()
-    shipped_orders = FarmerOrder.objects.filter(status='Shipped')
-    for order in shipped_orders:
-        # If 1 day has passed since last update
-        if order.updated_at + timedelta(days=1) <= now:
-            order.status = 'Delivered'
-            order.save()
-            
-            # Notify farmer
-            Notification.objects.create(
-                user=order.farmer,
-                message=f"Order {order.order_item.product.name} has been auto-marked as Delivered."
+from .models import FarmerOrder, OrderItem, ProductImport, StockAlert
+from .notifications import Dispatcher, notify
+from .analytics import line_total, lines_moved
+from .jobs import job
+from .ledger import record_deliveries
+from .order_status import move_lines
+from .images import UNREADABLE, build_derivatives
+from .product_import import run as run_import
+
+logger = logging.getLogger(__name__)
+
+AUTO_DELIVER_AFTER = timedelta(days=1)
+AUTO_DELIVER_CHUNK_SIZE = 1000
+
+
+def auto_update_delivered_orders(now=None, chunk_size=AUTO_DELIVER_CHUNK_SIZE):
+    """
+    Mark FarmerOrders that have been Shipped for a day as Delivered.
+
+    Works in chunks of `chunk_size`: one locked SELECT of the due rows (with
+    the names needed for the messages), one UPDATE, one move_lines() for the
+    parent orders' counters and status, and one bulk_create of all the
+    notifications. Returns how many rows were delivered.
+    """
+    now = now or timezone.now()
+    cutoff = now - AUTO_DELIVER_AFTER
+    total = last_id = 0
+    while True:
+        with transaction.atomic():
+            due = list(
+                FarmerOrder.objects.select_for_update(of=('self',))
+                .filter(status='Shipped', updated_at__lte=cutoff, id__gt=last_id)
+                .order_by('id')
+                .annotate(total=line_total())
+                .values('id', 'farmer_id', 'total', 'order_item_id', 'order_item__product__name',
+                        'order_item__order_id', 'order_item__order__user_id')
+                [:chunk_size]
+            )
+            if not due:
+                return total
+            # Bulk update skips post_save, so the customer notification the
+            # status-change signal would send is written here too.
+            FarmerOrder.objects.filter(id__in=[row['id'] for row in due], status='Shipped').update(
+                status='Delivered', updated_at=now,
+            )
+            # Farmer and customer messages are merged per order, and written
+            # with the order-delivered ones in a single bulk_create
+            with Dispatcher() as dispatcher:
+                for row in due:
+                    order_id, name = row['order_item__order_id'], row['order_item__product__name']
+                    dispatcher.add(row['farmer_id'], 'line_auto_delivered', order_id, 'farmer_order', row['id'], name)
+                    dispatcher.add(
+                        row['order_item__order__user_id'], 'line_status', order_id, 'farmer_order', row['id'],
+                        name, variant='Delivered',
+                    )
+                move_lines(Counter(row['order_item__order_id'] for row in due), 'Shipped', 'Delivered', dispatcher)
+            lines_moved(((row['farmer_id'], row['total']) for row in due), 'Delivered')
+            record_deliveries(row['order_item_id'] for row in due)
+        total += len(due)
+        last_id = due[-1]['id']
+
+
+# -----------------------------
+# Background jobs (home/jobs.py)
+# -----------------------------
+@job('order_placed')
+def order_placed(order_id, low_stock=()):
+    """Notifications for a newly placed order and the stock alerts it raised."""
+    items = list(
+        OrderItem.objects.filter(order_id=order_id)
+        .select_related('order', 'product')
+    )
+    # One message per farmer and one summary for the customer, in one INSERT
+    with Dispatcher() as dispatcher:
+        for item in items:
+            dispatcher.add(
+                item.product.user_id, 'new_order', order_id, 'order_item', item.id,
+                f"{item.product.name} ({item.quantity} pcs)",
             )
+            dispatcher.add(
+                item.order.user_id, 'order_placed', order_id, 'order_item', item.id,
+                f"{item.product.name} x {item.quantity}",
+            )
+
+        # low_stock: products whose alert place_order raised (home/stock_alerts.py)
+        alerts = StockAlert.objects.filter(product_id__in=low_stock).select_related('product') if low_stock else []
+        for alert in alerts:
+            dispatcher.add(
+                alert.user_id, 'low_stock', order_id, 'stock_alert', alert.id,
+                f"{alert.product.name} ({alert.product.stock} left)",
+            )
+
+
+@job('farmer_order_status_changed')
+def farmer_order_status_changed(farmer_order_id, status):
+    farmer_order = (
+        FarmerOrder.objects.select_related('order_item__order', 'order_item__product')
+        .filter(id=farmer_order_id).first()
+    )
+    if farmer_order is None:  # deleted since
+        return
+    notify(
+        farmer_order.order_item.order.user_id, 'line_status', 'farmer_order', farmer_order.id,
+        f"Your order for {farmer_order.order_item.product.name} is now {status}.", variant=status,
+    )
+
+
+@job('build_image_derivatives')
+def build_image_derivatives(model, pk, field):
+    obj = apps.get_model(model).objects.filter(pk=pk).first()
+    if obj is None:
+        return
+    fieldfile = getattr(obj, field)
+    try:
+        build_derivatives(fieldfile)
+    except UNREADABLE:  # retrying will not help, templates fall back to the original
+        logger.warning("Could not build derivatives for %s", fieldfile.name, exc_info=True)
+
+
+@job('import_products', atomic=False)  # commits batch by batch, see home/product_import.py
+def import_products(import_id):
+    product_import = ProductImport.objects.filter(pk=import_id).first()
+    # Failed too: run() marks an import Failed before re-raising for a retry
+    if product_import is not None and product_import.status != 'Done':
+        run_import(product_import)
@@ -0,0 +1,33 @@
+from django import template
+from django.utils.html import format_html
+
+from home.images import WIDTHS, derivative_name, has_derivatives
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(image, alt='', css_class='', sizes='(max-width: 768px) 50vw, 300px', style=''):
+    """
+    <picture> with WebP and JPEG srcsets for an ImageField file.
+
+    Falls back to the original upload until its derivatives have been built.
+    """
+    if not image:
+        return ''
+    storage = image.storage
+    if not has_derivatives(image.name, storage):
+        return format_html('<img src="{}" alt="{}" class="{}" style="{}" loading="lazy">', image.url, alt, css_class, style)
+
+    def srcset(ext):
+        return ', '.join(f'{storage.url(derivative_name(image.name, w, ext))} {w}w' for w in WIDTHS)
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" style="{}" loading="lazy">'
+        '</picture>',
+        srcset('webp'), sizes,
+        storage.url(derivative_name(image.name, WIDTHS[1], 'jpg')), srcset('jpg'), sizes,
+        alt, css_class, style,
+    )
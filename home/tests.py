@@ -1,34 +1,389 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import OrderItem, FarmerOrder, Notification, StockAlert
-
-@receiver(post_save, sender=OrderItem)
-def create_farmer_order_and_update_stock(sender, instance, created, **kwargs):
-    if created:
-        # 1. Create FarmerOrder automatically
-        FarmerOrder.objects.create(
-            farmer=instance.product.user,
-            order_item=instance,
-            status='Pending'
-        )
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from . import catalog_cache, jobs, ledger
+from .cart import price_cart
+from .models import (
+    FarmerOrder, FarmerPayment, Job, LedgerEntry, Order, Product, ProductImport, StockAlert, StockReservation,
+    UserProfile,
+)
+from .order_status import COUNTERS, InvalidTransition, derive_status, set_line_status, transition_order
+from .orders import (
+    OutOfStock, cancel_order, commit_reservations, place_order, release_expired_reservations, replayed_order,
+)
+from .product_import import run as run_import
+
+ADDRESS = SimpleNamespace(full_name='-', address_line='-', city='-', state='-', pincode='-', phone='-')
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Many buyers racing for the same products (needs the on-disk test database)."""
+
+    threads = 8
+    attempts = 5
+    stock = 20
+
+    def setUp(self):
+        farmer = User.objects.create_user('farmer')
+        self.customer = User.objects.create_user('customer')
+        self.product = Product.objects.create(name='Tomato', price=10, details='-', user=farmer, stock=self.stock)
+        # A second line with spare stock, so every order decrements two rows at once
+        self.other = Product.objects.create(name='Onion', price=5, details='-', user=farmer, stock=self.stock * 3)
+
+    def test_stock_is_never_oversold(self):
+        outcomes = []
+        lock = threading.Lock()
+
+        def buyer():
+            try:
+                for _ in range(self.attempts):
+                    try:
+                        place_order(self.customer, ADDRESS, 'cod', price_cart({self.product.pk: 1, self.other.pk: 1}))
+                        outcome = 'placed'
+                    except OutOfStock:
+                        outcome = 'out_of_stock'
+                    with lock:
+                        outcomes.append(outcome)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer) for _ in range(self.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(len(outcomes), self.threads * self.attempts)
+        self.assertEqual(outcomes.count('placed'), self.stock)
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(StockReservation.objects.filter(product=self.product).count(), self.stock)
+        self.assertEqual(FarmerOrder.objects.filter(order_item__product=self.product).count(), self.stock)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.stock, self.stock * 2)
+        # The threshold (5) was crossed by exactly one decrement
+        self.assertEqual(list(StockAlert.objects.values_list('product_id', flat=True)), [self.product.pk])
+        crossings = [job.payload['low_stock'] for job in Job.objects.filter(name='order_placed')]
+        self.assertEqual([c for c in crossings if c], [[self.product.pk]])
+
+
+class ReservationExpiryTests(TestCase):
+    def setUp(self):
+        farmer = User.objects.create_user('farmer')
+        self.customer = User.objects.create_user('customer')
+        self.product = Product.objects.create(name='Tomato', price=10, details='-', user=farmer, stock=10)
+
+    def place(self, payment_method):
+        return place_order(self.customer, ADDRESS, payment_method, price_cart({self.product.pk: 3}))
+
+    def sweep(self):
+        return release_expired_reservations(now=timezone.now() + timedelta(hours=1))
+
+    def assert_survived(self, order):
+        order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertNotEqual(order.status, 'Cancelled')
+        self.assertEqual(self.product.stock, 7)
 
-        # 2. Reduce product stock
-        product = instance.product
-        product.stock -= instance.quantity
-        if product.stock < 0:
-            product.stock = 0
-        product.save()
-
-        # 3. Low stock alert
-        if product.stock <= 5:
-            StockAlert.objects.get_or_create(
-                product=product,
-                user=product.user,
-                defaults={'threshold': 5}
+    def test_methods_without_a_payment_callback_commit_at_placement(self):
+        order = self.place('card')
+        self.assertEqual(self.sweep(), 0)
+        self.assert_survived(order)
+
+    @mock.patch('home.orders.HOLD_UNTIL_PAID', {'card'})
+    def test_paid_order_survives_the_sweep(self):
+        order = self.place('card')
+        commit_reservations(order)
+        self.assertEqual(self.sweep(), 0)
+        self.assert_survived(order)
+
+    @mock.patch('home.orders.HOLD_UNTIL_PAID', {'card'})
+    def test_unpaid_order_is_cancelled_and_restocked(self):
+        order = self.place('card')
+        self.assertEqual(self.sweep(), 1)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'Cancelled')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+
+    @mock.patch('home.orders.HOLD_UNTIL_PAID', {'card'})
+    def test_order_success_page_does_not_confirm_payment(self):
+        order = self.place('card')
+        self.client.force_login(self.customer)
+        self.client.post(f'/ordersuccess/{order.pk}/')
+        self.assertFalse(StockReservation.objects.filter(order=order, status='Committed').exists())
+
+
+class OrderTestCase(TestCase):
+    """Two farmers with one product each; place() orders one of both."""
+
+    def setUp(self):
+        self.farmers = [User.objects.create_user(f'farmer{i}') for i in range(2)]
+        self.customer = User.objects.create_user('customer')
+        self.products = [
+            Product.objects.create(name=f'Product {i}', price=10, details='-', user=farmer, stock=100)
+            for i, farmer in enumerate(self.farmers)
+        ]
+
+    def place(self):
+        return place_order(self.customer, ADDRESS, 'cod', price_cart({p.pk: 1 for p in self.products}))
+
+    def line(self, order, farmer):
+        return FarmerOrder.objects.select_related('order_item').get(order_item__order=order, farmer=farmer)
+
+
+class OrderStatusTests(OrderTestCase):
+    def assert_counters_match_lines(self):
+        for order in Order.objects.all():
+            lines = dict(
+                FarmerOrder.objects.filter(order_item__order=order)
+                .values_list('status').annotate(n=Count('id'))
             )
+            self.assertEqual({state: getattr(order, field) for state, field in COUNTERS.items()},
+                             {state: lines.get(state, 0) for state in COUNTERS})
+            self.assertEqual(order.status, derive_status(lines))
+
+    def test_derive_status(self):
+        self.assertEqual(derive_status({'Pending': 2}), 'Pending')
+        self.assertEqual(derive_status({'Pending': 1, 'Cancelled': 1}), 'Partially Cancelled')
+        self.assertEqual(derive_status({'Pending': 1, 'Shipped': 1}), 'Partially Shipped')
+        self.assertEqual(derive_status({'Shipped': 1, 'Delivered': 1}), 'Shipped')
+        self.assertEqual(derive_status({'Out for Delivery': 1, 'Delivered': 1}), 'Out for Delivery')
+        self.assertEqual(derive_status({'Delivered': 1, 'Cancelled': 1}), 'Delivered')
+        self.assertEqual(derive_status({'Cancelled': 2}), 'Cancelled')
+        self.assertIsNone(derive_status({}))
+
+    def test_partial_ship_then_ship_then_deliver(self):
+        order = self.place()
+        first, second = (self.line(order, farmer) for farmer in self.farmers)
+        self.assertEqual(set_line_status(first, 'Shipped'), 'Partially Shipped')
+        self.assertEqual(set_line_status(second, 'Shipped'), 'Shipped')
+        self.assertEqual(set_line_status(first, 'Delivered'), 'Shipped')
+        self.assertEqual(set_line_status(second, 'Delivered'), 'Delivered')
+        self.assert_counters_match_lines()
+
+    def test_illegal_transitions_are_rejected(self):
+        order = self.place()
+        line = self.line(order, self.farmers[0])
+        with self.assertRaises(InvalidTransition):
+            set_line_status(line, 'Delivered')  # must ship first
+        set_line_status(line, 'Shipped')
+        with self.assertRaises(InvalidTransition):
+            set_line_status(line, 'Cancelled')
+        with self.assertRaises(InvalidTransition):
+            transition_order(order, 'Cancelled')  # Partially Shipped
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'Partially Shipped')
+        self.assert_counters_match_lines()
 
-        # 4. Notification to farmer
-        Notification.objects.create(
-            user=instance.product.user,
-            message=f"New order: {instance.product.name} x {instance.quantity}"
+    def test_bulk_update_of_the_whole_queue(self):
+        farmer = self.farmers[0]
+        UserProfile.objects.create(user=farmer, role='farmer', phone='1')
+        orders = [self.place() for _ in range(3)]
+        set_line_status(self.line(orders[0], farmer), 'Cancelled')
+        self.client.force_login(farmer)
+        self.client.post('/farmerorders/?status=all', {'action': 'bulk', 'status': 'Shipped', 'scope': 'all'})
+
+        self.assertEqual(
+            sorted(FarmerOrder.objects.filter(farmer=farmer).values_list('status', flat=True)),
+            ['Cancelled', 'Shipped', 'Shipped'],
+        )
+        self.assertEqual(
+            [Order.objects.get(pk=order.pk).status for order in orders],
+            ['Partially Cancelled', 'Partially Shipped', 'Partially Shipped'],
         )
+        self.assert_counters_match_lines()
+
+
+class LedgerTests(OrderTestCase):
+    def assert_balances_match_entries(self):
+        for farmer in self.farmers:
+            entries = LedgerEntry.objects.filter(farmer=farmer)
+            balance = ledger.balance(farmer)
+            self.assertEqual(balance.balance, entries.aggregate(total=Sum('amount'))['total'] or 0)
+            self.assertEqual(balance.earned_total, sum(e.amount for e in entries if e.kind == 'earning'))
+            self.assertEqual(balance.settled_total, -sum(e.amount for e in entries if e.kind == 'settlement'))
+
+    def test_balance_follows_delivery_cancel_and_settlement(self):
+        delivered, cancelled, open_order = self.place(), self.place(), self.place()
+        transition_order(delivered, 'Shipped')
+        transition_order(delivered, 'Delivered')
+        cancel_order(cancelled)
+        set_line_status(self.line(open_order, self.farmers[0]), 'Shipped')
+        self.assert_balances_match_entries()
+        self.assertEqual([ledger.balance(f).balance for f in self.farmers], [10, 10])
+
+        self.assertEqual(ledger.settle(), (2, 20))
+        self.assert_balances_match_entries()
+        self.assertEqual([ledger.balance(f).balance for f in self.farmers], [0, 0])
+        self.assertEqual([ledger.balance(f).settled_total for f in self.farmers], [10, 10])
+
+    def test_settling_twice_posts_once(self):
+        order = self.place()
+        transition_order(order, 'Shipped')
+        transition_order(order, 'Delivered')
+        ledger.settle()
+        entries = LedgerEntry.objects.count()
+        self.assertEqual(ledger.settle(), (0, 0))
+        self.assertEqual(LedgerEntry.objects.count(), entries)
+        self.assertFalse(FarmerPayment.objects.filter(status='Pending').exists())
+        self.assert_balances_match_entries()
+
+
+class CheckoutTokenTests(OrderTestCase):
+    def place_with(self, user, token):
+        return place_order(user, ADDRESS, 'cod', price_cart({self.products[0].pk: 1}), token)
+
+    def test_token_is_unique_per_customer(self):
+        order = self.place_with(self.customer, 'token')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.place_with(self.customer, 'token')
+        self.assertEqual(replayed_order(self.customer, 'token'), order)
+
+        other = User.objects.create_user('other')
+        self.assertNotEqual(self.place_with(other, 'token'), order)
+
+
+class JobQueueTests(TestCase):
+    def test_stale_running_jobs_use_up_their_attempts(self):
+        stale = timezone.now() - jobs.LOCK_TIMEOUT - timedelta(minutes=1)
+        retried = Job.objects.create(name='import_products', status='Running', locked_at=stale, attempts=0)
+        exhausted = Job.objects.create(name='import_products', status='Running', locked_at=stale, attempts=4)
+
+        claimed = jobs.claim('worker')
+
+        self.assertEqual([job.pk for job in claimed], [retried.pk])
+        self.assertEqual(claimed[0].attempts, 1)
+        exhausted.refresh_from_db()
+        self.assertEqual((exhausted.status, exhausted.attempts), ('Failed', exhausted.max_attempts))
+
+    @mock.patch('home.tasks.build_derivatives', side_effect=Image.DecompressionBombError('too many pixels'))
+    def test_oversized_image_job_is_dropped_not_retried(self, build):
+        farmer = User.objects.create_user('farmer')
+        product = Product.objects.create(name='Tomato', price=1, details='-', user=farmer, image='products/huge.png')
+        Job.objects.all().delete()
+        job = Job.objects.create(name='build_image_derivatives', payload={'model': 'home.Product', 'pk': product.pk, 'field': 'image'})
+
+        with self.assertLogs('home.tasks', 'WARNING'):
+            self.assertEqual(jobs.run_batch('worker'), (1, 0))
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+
+
+class CatalogCacheTests(SimpleTestCase):
+    def test_concurrent_misses_rebuild_once(self):
+        name, calls, results = uuid.uuid4().hex, [], []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.3)
+            return 'listing'
+
+        def request():
+            results.append(catalog_cache.cached(name, 'test', compute))
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['listing'] * 8)
+
+    def test_lock_left_by_a_dead_worker_is_broken(self):
+        name = uuid.uuid4().hex
+        key = f'catalog:test:{catalog_cache.generation("test")}:{hashlib.md5(name.encode()).hexdigest()}'
+        path = catalog_cache._acquire(key)
+        expired = time.time() - catalog_cache.LOCK_TIMEOUT - 1
+        os.utime(path, (expired, expired))
+
+        self.assertEqual(catalog_cache.cached(name, 'test', lambda: 'listing'), 'listing')
+        self.assertFalse(os.path.exists(path))
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        farmer = User.objects.create_user('farmer')
+        Product.objects.create(name='Tomato', price=10, details='Red and ripe', user=farmer)
+        customer = User.objects.create_user('customer')
+        UserProfile.objects.create(user=customer, role='customer', phone='1')
+        self.client.force_login(customer)
+
+    def test_query_with_no_indexable_words_finds_nothing(self):
+        for q in ('t', '!!'):
+            with self.subTest(q=q):
+                response = self.client.get('/products/', {'q': q})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context['products']), [])
+
+    def test_prefix_query_is_ranked(self):
+        response = self.client.get('/products/', {'q': 'tom'})
+        self.assertEqual([p.name for p in response.context['products']], ['Tomato'])
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        media_root = override_settings(MEDIA_ROOT=media)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.farmer = User.objects.create_user('farmer')
+
+    def run_import(self, csv):
+        product_import = ProductImport(farmer=self.farmer)
+        product_import.csv_file.save('products.csv', ContentFile(csv.encode()))
+        return run_import(product_import)
+
+    def test_csv_without_image_archive(self):
+        product_import = self.run_import('name,price,details,image\nTomato,12,Ripe,\nOnion,8,Red,onion.png\n')
+        self.assertEqual(product_import.status, 'Done')
+        self.assertEqual((product_import.created, product_import.failed), (1, 1))
+        self.assertEqual(product_import.errors, [[3, 'no image archive was uploaded']])
+        self.assertFalse(Product.objects.get(name='Tomato').image)
+
+    def test_unexpected_error_fails_the_import_and_a_retry_resumes(self):
+        csv = 'name,price,details\n' + ''.join(f'P{i},1,-\n' for i in range(5))
+        with mock.patch('home.product_import.index_new_products', side_effect=OperationalError('locked')):
+            with self.assertRaises(OperationalError):
+                self.run_import(csv)
+        product_import = ProductImport.objects.get()
+        self.assertEqual((product_import.status, product_import.rows_read), ('Failed', 0))
+
+        product_import = run_import(product_import)
+        self.assertEqual((product_import.status, product_import.created), ('Done', 5))
+        self.assertEqual(Product.objects.count(), 5)
+
+    def test_images_of_a_rolled_back_batch_are_deleted(self):
+        image = io.BytesIO()
+        Image.new('RGB', (4, 4)).save(image, 'PNG')
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.writestr('tomato.png', image.getvalue())
+        product_import = ProductImport(farmer=self.farmer)
+        product_import.csv_file.save('products.csv', ContentFile(b'name,price,details,image\nTomato,1,-,tomato.png\n'))
+        product_import.images.save('images.zip', ContentFile(archive.getvalue()))
+
+        with mock.patch('home.product_import.index_new_products', side_effect=OperationalError('locked')):
+            with self.assertRaises(OperationalError):
+                run_import(product_import)
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'products')), [])
+
+        run_import(product_import)
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'products'))), 1)
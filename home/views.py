@@ -3,21 +3,31 @@ from django.http import HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from .models import Product, Order,Cart,UserProfile,Category,Review,Address,OrderItem,FarmerOrder,FarmerPayment,Notification,StockAlert
+from .models import Product, Order,Cart,UserProfile,Category,Review,Address,OrderItem,FarmerOrder,FarmerPayment,Notification,StockAlert,ProductImport
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseForbidden
-from .forms import ProductForm,UserProfileForm,AddressForm
-from django.core.paginator import Paginator
+from .forms import ProductForm,ProductImportUploadForm,UserProfileForm,AddressForm
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
 from django.views.decorators.http import require_POST
 from decimal import Decimal
-from django.db.models import Sum, Count
+from django.db.models import Count
 from django.views.decorators.cache import never_cache
-from django.utils import timezone
-from datetime import timedelta
 from django.db.models import Prefetch
+from django.db import IntegrityError, transaction
+import uuid
+from .search import search_products
+from .pagination import CursorPaginator
+from . import analytics, badges, catalog_cache, ledger, order_queue
+from .facets import apply_filters, compute_facets
+from .cart import PricedLine, delivery_charge, price_cart
+from .orders import (
+    OutOfStock, cancel_order, place_order, release_reservations, replayed_order,
+)
+from .notifications import read_page
+from .jobs import enqueue
+from .order_status import InvalidTransition, set_line_status, set_lines_status, transition_order
 
 
 
@@ -29,30 +39,33 @@ def homefn(request):
     if request.user.is_authenticated:
         try:
             role = request.user.userprofile.role
-        except:
+        except UserProfile.DoesNotExist:
             pass
 
-    prdcts = Product.objects.all()
-    categories = Category.objects.all()
-    fresh_products = Product.objects.order_by('-created_at')[:8] 
-
+    # The feed data is cached, not the page: base.html echoes the request
+    # (search box, messages), so the HTML is rendered per request.
     return render(request, 'home.html', {
-        'prdcts': prdcts,
         'role': role,
         'user': request.user,
-        'categories': categories,
-        'fresh_products': fresh_products  
+        **catalog_cache.home_feed(),
     })
 
+def cached_categories():
+    return catalog_cache.cached('categories', 'categories', lambda: list(Category.objects.all()))
+
 @login_required
 def allcategoriesfn(request):
-    categories = Category.objects.all()
+    categories = cached_categories()
     return render(request, 'allcategories.html', {'categories': categories})
 
 @login_required
 def categoryproductsfn(request, cid):
     category = get_object_or_404(Category, id=cid)
-    products = Product.objects.filter(ctgry=category)
+    products = catalog_cache.cached(
+        f'category:{category.id}',
+        catalog_cache.category_scope(category.id),
+        lambda: list(Product.objects.filter(ctgry=category).order_by('-created_at')),
+    )
     return render(request, 'categoryproducts.html', {'category': category, 'products': products})
 
 
@@ -142,13 +155,17 @@ def addproductfn(request):
     if request.method == 'POST':
         name = request.POST['name']
         price = request.POST['price']
+        details = request.POST.get('description', '')
+        unit = request.POST.get('unit') or 'kg'
+        stock = request.POST.get('stock') or 0
+        low_stock_threshold = request.POST.get('low_stock_threshold') or 5
         image = request.FILES.get('image')
         category_id = request.POST.get('category')
 
         # Validate image
         if not image:
             messages.error(request, "Image is required.")
-            return render(request, 'addproduct.html', {'categories': categories})
+            return render(request, 'addproduct.html', {'categories': categories, 'units': Product.UNIT_CHOICES})
 
         # Get the selected category or None
         category = Category.objects.get(id=category_id) if category_id else None
@@ -157,6 +174,10 @@ def addproductfn(request):
         Product.objects.create(
             name=name,
             price=price,
+            details=details,
+            unit=unit,
+            stock=stock,
+            low_stock_threshold=low_stock_threshold,
             image=image,
             ctgry=category,
             user=request.user
@@ -165,46 +186,74 @@ def addproductfn(request):
         return redirect('/myproducts/')
 
     # Render the template with categories
-    return render(request, 'addproduct.html', {'categories': categories})
+    return render(request, 'addproduct.html', {'categories': categories, 'units': Product.UNIT_CHOICES})
 
 
 @login_required
 def productsfn(request): 
-    categories = Category.objects.all()
+    categories = cached_categories()
     search_query = request.GET.get('q', '')
     selected_category = request.GET.get('category')
+    selected_unit = request.GET.get('unit') or None
+    selected_price = request.GET.get('price') or None
     sort_by = request.GET.get('sort')
 
+    if selected_category and not selected_category.isdigit():
+        selected_category = None
+
     # Start with all products
     all_products = Product.objects.all()
+    owner = None
 
     # ✅ Restrict farmers to only their own products
     if hasattr(request.user, 'userprofile') and request.user.userprofile.role == 'farmer':
         all_products = all_products.filter(user=request.user)
+        owner = request.user.id
 
-    # Search filter
+    # Search filter (ranked, prefix-matched via the search index)
     if search_query:
-        all_products = all_products.filter(name__icontains=search_query)
+        all_products = search_products(search_query, all_products)
+
+    # Sidebar facet counts for the current search, one grouped query (cached)
+    facets = catalog_cache.cached(
+        f'facets:{owner}:{search_query}:{selected_category}:{selected_unit}:{selected_price}',
+        catalog_cache.ALL,
+        lambda: compute_facets(all_products, categories, selected_category, selected_unit, selected_price),
+    )
 
-    # Category filter
-    if selected_category:
-        all_products = all_products.filter(ctgry_id=selected_category)
+    # Category / unit / price filters
+    all_products = apply_filters(all_products, selected_category, selected_unit, selected_price)
 
-    # Sort by price
+    # Sort by price (search results default to relevance, else newest first)
     if sort_by == 'low':
-        all_products = all_products.order_by('price')
+        ordering = ['price', 'id']
     elif sort_by == 'high':
-        all_products = all_products.order_by('-price')
+        ordering = ['-price', '-id']
+    elif search_query:
+        ordering = ['-search_score', '-created_at', '-id']
+    else:
+        ordering = ['-created_at', '-id']
 
-    # Pagination
-    paginator = Paginator(all_products, 9)
-    page = request.GET.get('page')
-    paginated_products = paginator.get_page(page)
+    # Keyset pagination: no COUNT(*), no OFFSET
+    paginator = CursorPaginator(all_products, ordering, per_page=9)
+    cursor = request.GET.get('cursor')
+    if search_query:
+        paginated_products = paginator.get_page(cursor)
+    else:
+        # Plain listings are cached per category generation
+        paginated_products = catalog_cache.cached(
+            f'products:{owner}:{selected_unit}:{selected_price}:{sort_by}:{cursor}',
+            catalog_cache.category_scope(selected_category),
+            lambda: paginator.get_page(cursor),
+        )
 
     return render(request, 'products.html', {
         'products': paginated_products,
         'categories': categories,
+        'facets': facets,
         'selected_category': selected_category,
+        'selected_unit': selected_unit,
+        'selected_price': selected_price,
         'search_query': search_query,
         'sort_by': sort_by,
     })
@@ -213,7 +262,7 @@ def productsfn(request):
 @login_required
 def viewproductfn(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    reviews = product.review_set.all()
+    reviews = product.review_set.select_related('user').order_by('-created_at')
     return render(request, 'viewproduct.html', {
         'product': product,
         'reviews': reviews
@@ -242,6 +291,10 @@ def addreviewfn(request, order_item_id):
         rating = request.POST.get("rating")
         comment = request.POST.get("comment", "").strip()
 
+        if rating not in [str(value) for value, _ in Review.RATING_CHOICES]:
+            messages.error(request, "Please select a rating between 1 and 5.")
+            return render(request, "add_review.html", {"order_item": order_item})
+
         # Handle uploaded file
         review_image = request.FILES.get("review_image")
 
@@ -266,14 +319,16 @@ def addreviewfn(request, order_item_id):
             #     messages.error(request, "Invalid image file.")
             #     return render(request, "add_review.html", {"order_item": order_item})
 
-        # Create review (include image if present)
-        review = Review.objects.create(
-            product=order_item.product,
-            user=request.user,
-            rating=rating,
-            comment=comment,
-            review_image=review_image  # works if Review model has ImageField named review_image
-        )
+        # Create review (include image if present); the product's rating
+        # aggregates are updated by a signal in the same transaction
+        with transaction.atomic():
+            review = Review.objects.create(
+                product=order_item.product,
+                user=request.user,
+                rating=int(rating),
+                comment=comment,
+                review_image=review_image  # works if Review model has ImageField named review_image
+            )
 
         messages.success(request, "Review submitted successfully.")
         # Redirect to the order detail page
@@ -303,6 +358,10 @@ def editproductfn(request, pid):
     if request.method == 'POST':
         product.name = request.POST['name']
         product.price = request.POST['price']
+        if request.POST.get('stock'):
+            product.stock = request.POST['stock']
+        if request.POST.get('low_stock_threshold'):
+            product.low_stock_threshold = request.POST['low_stock_threshold']
         if 'image' in request.FILES:
             product.image = request.FILES['image']
         product.save()
@@ -335,7 +394,7 @@ def addtocartfn(request, pid):
     # ✅ Add to session cart: { product_id: quantity }
     cart = request.session.get('cart', {})
     cart[str(pid)] = cart.get(str(pid), 0) + 1
-    request.session['cart'] = cart
+    badges.cart_changed(request, cart)
 
     messages.success(request, f"{product.name} added to your cart!")
     return redirect('/products/')
@@ -344,8 +403,6 @@ def addtocartfn(request, pid):
 @login_required
 def viewcartfn(request):
     cart = request.session.get('cart', {})
-    items = []
-    subtotal = 0
 
     # ✅ Handle quantity update request
     if request.method == 'POST' and 'update_qty' in request.POST:
@@ -355,28 +412,11 @@ def viewcartfn(request):
             cart.pop(pid, None)  # Remove item if qty <= 0
         else:
             cart[pid] = new_qty
-        request.session['cart'] = cart
+        badges.cart_changed(request, cart)
         return redirect('/viewcart/')  # Refresh page after update
 
-    # ✅ Load cart items
-    for pid, qty in cart.items():
-        try:
-            product = Product.objects.get(id=pid)
-            item_total = product.price * qty
-            subtotal += item_total
-            items.append({'product': product, 'qty': qty, 'subtotal': item_total})
-        except Product.DoesNotExist:
-            continue
-
-    # ✅ Delivery charges
-    if subtotal == 0:
-        delivery = 0
-    elif subtotal >= 500:
-        delivery = 0
-    else:
-        delivery = 50
-
-    grand_total = subtotal + delivery
+    # ✅ Price all cart lines with one query
+    priced = price_cart(cart)
 
     # ✅ Address form
     if request.method == 'POST' and 'address_form' in request.POST:
@@ -393,10 +433,10 @@ def viewcartfn(request):
         form = AddressForm()
 
     return render(request, 'viewcart.html', {
-        'items': items,
-        'subtotal': subtotal,
-        'delivery': delivery,
-        'grand_total': grand_total,
+        'items': priced.lines,
+        'subtotal': priced.subtotal,
+        'delivery': priced.delivery,
+        'grand_total': priced.grand_total,
         'form': form,
         'range': range(1, 11),  # For quantity dropdown
     })
@@ -406,7 +446,7 @@ def viewcartfn(request):
 def removefromcartfn(request, pid):
     cart = request.session.get('cart', {})
     cart.pop(str(pid), None)
-    request.session['cart'] = cart
+    badges.cart_changed(request, cart)
     return redirect('/viewcart/')
 
 # ------------------ CHECKOUT ------------------
@@ -427,25 +467,20 @@ def checkoutfn(request):
         messages.error(request, "Your cart is empty. Please add items before checkout.")
         return redirect('/products/')
 
-    items, subtotal = [], 0
-    for pid, qty in source.items():
-        product = get_object_or_404(Product, id=pid)
-        qty = int(qty)
-        line_total = product.price * qty
-        subtotal += line_total
-        items.append({"product": product, "quantity": qty, "total": line_total})
-
-    delivery = 0 if subtotal >= 500 or subtotal == 0 else 50
-    grand_total = subtotal + delivery
+    priced = price_cart(source)
+    if priced.missing:
+        messages.error(request, "Some items in your cart are no longer available.")
+        return redirect('/viewcart/')
 
     context = {
-        "items": items,
-        "total_price": subtotal,
-        "delivery": delivery,
-        "total": grand_total,
+        "items": priced.lines,
+        "total_price": priced.subtotal,
+        "delivery": priced.delivery,
+        "total": priced.grand_total,
         "addresses": Address.objects.filter(user=request.user),
         "is_buy_now": is_buy_now,
         "qty_options": list(range(1, 11)),
+        "checkout_token": uuid.uuid4().hex,
     }
     return render(request, "checkout.html", context)
 
@@ -457,45 +492,19 @@ def myordersfn(request):
     """
     orders = (
         Order.objects.filter(user=request.user)
-        .prefetch_related('orderitem_set__product')
-        .order_by('-created_at')
+        .prefetch_related('orderitem_set__product__user')
     )
+    paginator = CursorPaginator(orders, ['-created_at', '-id'], per_page=10)
+    orders = paginator.get_page(request.GET.get('cursor'))
     return render(request, 'myorders.html', {'orders': orders, 'title': 'My Orders'})
 
 @login_required
 def orderhistoryfn(request):
-    now = timezone.now()
-    all_orders = Order.objects.filter(user=request.user)
-
-    for order in all_orders:
-        time_diff = now - order.created_at
-
-        if order.status == 'Pending' and time_diff > timedelta(days=1):
-            order.status = 'Shipped'
-            order.save()
-
-        elif order.status == 'Shipped' and time_diff > timedelta(days=1, hours=12):
-            order.status = 'Out for Delivery'
-            order.save()
-
-        elif order.status == 'Out for Delivery' and time_diff > timedelta(days=2):
-            order.status = 'Delivered'
-            order.save()
-
-            # ✅ Notify customer if not already notified
-            if order.user and not Notification.objects.filter(
-                user=order.user,
-                message__contains=f"order #{order.id} has been delivered"
-            ).exists():
-                Notification.objects.create(
-                    user=order.user,
-                    message=f"Your order #{order.id} has been delivered!"
-                )
-
+    # Statuses are advanced by `manage.py advance_orders` (home/lifecycle.py)
     # Show only completed orders
     past_statuses = ['Delivered', 'Cancelled']
     orders = Order.objects.filter(user=request.user, status__in=past_statuses).prefetch_related(
-        Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('product__owner'))
+        Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('product__user'))
     ).order_by('-created_at')
 
     return render(request, 'myorders.html', {'orders': orders, 'title': 'Order History'})
@@ -514,20 +523,45 @@ def orderdetailfn(request, order_id):
 def cancelorderfn(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
 
-    if order.status == "Pending":  # only allow cancel if not shipped
-        order.status = "Cancelled"
-        order.save()
+    if cancel_order(order):  # only allow cancel if not shipped; returns reserved stock
         messages.success(request, f"Order #{order.id} has been cancelled.")
     else:
         messages.error(request, f"Order #{order.id} cannot be cancelled (already {order.status}).")
 
     return redirect('/myorders/')  # 👈 fixed (direct path)
 
+PAYMENT_REDIRECTS = {
+    'upi': '/upi-payment/',
+    'card': '/card-payment/',
+    'netbanking': '/netbanking-payment/',
+}
+
+
+def order_redirect(order):
+    """Where placeorderfn sends the customer after placing `order`."""
+    if order.payment_method == 'cod':
+        return redirect(f"/ordersuccess/{order.id}/")
+    return redirect(PAYMENT_REDIRECTS[order.payment_method])
+
+
 @login_required
 def placeorderfn(request):
     if request.method == "POST":
         payment_method = request.POST.get("payment_method")
         selected_address_id = request.POST.get("selected_address")
+        checkout_token = request.POST.get("checkout_token")
+
+        # ✅ Double submit / retry: send back to the original order
+        if not checkout_token:
+            messages.error(request, "Your checkout session expired. Please try again.")
+            return redirect('/checkout/')
+        replay = replayed_order(request.user, checkout_token)
+        if replay:
+            return order_redirect(replay)
+
+        if payment_method != 'cod' and payment_method not in PAYMENT_REDIRECTS:
+            messages.error(request, "Please select a valid payment method.")
+            return redirect('/checkout/')
 
         # ✅ Validate address
         if not selected_address_id:
@@ -550,57 +584,29 @@ def placeorderfn(request):
             messages.error(request, "Your cart is empty.")
             return redirect('/checkout/')
 
-        subtotal = 0
+        # ✅ Price every line with one catalog query
+        priced = price_cart(source)
+        if priced.missing or not priced:
+            messages.error(request, "Some items in your cart are no longer available.")
+            return redirect('/viewcart/')
 
         # ✅ Prevent farmers from buying their own products
-        for pid in source.keys():
-            product = get_object_or_404(Product, id=pid)
-            if product.user == request.user:
-                return redirect(f'/product-restriction/{product.name}/')
-
-        # 1️⃣ Create main Order
-        order = Order.objects.create(
-            user=request.user,
-            address=f"{address.full_name}, {address.address_line}, {address.city}, {address.state}, {address.pincode} | Phone: {address.phone}",
-            payment_method=payment_method,
-            total_amount=0  # will update after calculating subtotal
-        )
+        for line in priced.lines:
+            if line.product.user_id == request.user.id:
+                return redirect(f'/product-restriction/{line.product.name}/')
 
-        # 2️⃣ Create OrderItem and FarmerOrder for each product
-        for pid, qty in source.items():
-            product = get_object_or_404(Product, id=pid)
-            qty = int(qty)
-            line_total = product.price * qty
-            subtotal += line_total
-
-            # Create OrderItem
-            order_item = OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=qty,
-                price=product.price
-            )
-
-            # ✅ Create FarmerOrder linked to the product owner
-            FarmerOrder.objects.create(
-                farmer=product.user,  # important: product.user is the farmer
-                order_item=order_item,
-                status='Pending'
-            )
-
-            # ✅ Create FarmerPayment record
-            FarmerPayment.objects.create(
-                farmer=product.user,
-                order_item=order_item,
-                amount=line_total,
-                status='Pending'
-            )
-
-        # 3️⃣ Delivery charges and total
-        delivery = 0 if subtotal == 0 or subtotal >= 500 else 50
-        grand_total = subtotal + delivery
-        order.total_amount = grand_total
-        order.save()
+        # ✅ Order, items, farmer records, notifications and stock in one transaction
+        try:
+            order = place_order(request.user, address, payment_method, priced, checkout_token)
+        except OutOfStock as e:
+            messages.error(request, f"Not enough stock for: {e}. Please update your cart.")
+            return redirect('/viewcart/')
+        except IntegrityError:
+            # A concurrent submit with the same token won the race
+            replay = replayed_order(request.user, checkout_token)
+            if replay is None:
+                raise
+            return order_redirect(replay)
 
         # Store latest order ID for payment or confirmation page
         request.session['latest_order_id'] = order.id
@@ -610,20 +616,11 @@ def placeorderfn(request):
             if is_buy_now:
                 request.session.pop('buy_now', None)
             else:
-                request.session.pop('cart', None)
+                badges.cart_changed(request, None)
             request.session.modified = True
             messages.success(request, "Order placed successfully with Cash on Delivery!")
-            return redirect(f"/ordersuccess/{order.id}/")
-
-        elif payment_method == "upi":
-            return redirect('/upi-payment/')
-        elif payment_method == "card":
-            return redirect('/card-payment/')
-        elif payment_method == "netbanking":
-            return redirect('/netbanking-payment/')
-        else:
-            messages.error(request, "Please select a valid payment method.")
-            return redirect('/checkout/')
+
+        return order_redirect(order)
 
     # If GET request, redirect to home
     return redirect('/')
@@ -651,6 +648,8 @@ def netbanking_payment(request):
 
 @login_required
 def ordersuccessfn(request, order_id):
+    # Display only: a customer's own request never confirms payment, so held
+    # stock is committed from a verified confirmation (orders.HOLD_UNTIL_PAID)
     order = get_object_or_404(Order, id=order_id, user=request.user)
     return render(request, "ordersuccess.html", {"order": order})
 
@@ -676,17 +675,17 @@ def buynowfn(request, product_id):
     request.session.modified = True
 
     subtotal = product.price * qty
-    delivery = 0 if subtotal >= 500 or subtotal == 0 else 50
-    grand_total = subtotal + delivery
+    delivery = delivery_charge(subtotal)
 
     context = {
-        "items": [{"product": product, "quantity": qty, "total": subtotal}],
+        "items": [PricedLine(product=product, quantity=qty, total=subtotal)],
         "total_price": subtotal,
         "delivery": delivery,
-        "total": grand_total,
+        "total": subtotal + delivery,
         "addresses": Address.objects.filter(user=request.user),
         "is_buy_now": True,
         "qty_options": list(range(1, 11)),
+        "checkout_token": uuid.uuid4().hex,
     }
     return render(request, "checkout.html", context)
 
@@ -704,7 +703,7 @@ def farmerprofilefn(request, pk):
     stock_alerts = []
     if is_owner:
         notifications = Notification.objects.filter(user=user).order_by('-created_at')
-        stock_alerts = StockAlert.objects.filter(farmer=user).order_by('-created_at')
+        stock_alerts = StockAlert.objects.filter(user=user).select_related('product').order_by('-created_at')
 
     # ✅ Profile update
     if request.method == 'POST' and is_owner:
@@ -794,7 +793,7 @@ def updatecartqtyfn(request, pid):
         cart = request.session.get("cart", {})
         if str(pid) in cart:
             cart[str(pid)] = qty
-            request.session["cart"] = cart
+            badges.cart_changed(request, cart)
             messages.success(request, "Quantity updated.")
     return redirect("/viewcart/")
 
@@ -841,38 +840,33 @@ def farmer_dashboardfn(request):
     # Total products
     total_products = Product.objects.filter(user=farmer).count()
 
-    # Farmer Orders (per farmer, per product)
-    farmer_orders_qs = FarmerOrder.objects.filter(farmer=farmer)
-    total_orders = farmer_orders_qs.count()
-    pending_orders = farmer_orders_qs.filter(status='Pending').count()
-    delivered_orders = farmer_orders_qs.filter(status='Delivered').count()
-
-    # Earnings calculation
-    total_earnings = farmer_orders_qs.filter(status='Delivered').aggregate(
-        total=Sum('order_item__price')
-    )['total'] or 0
+    # Order figures: open lines live, history from the daily rollup (home/analytics.py)
+    stats = analytics.dashboard(farmer)
 
-    # Customers who bought products
-    customers = farmer_orders_qs.values_list('order_item__order__user__username', flat=True).distinct()
+    # Recent customers, from the latest lines only
+    recent = FarmerOrder.objects.filter(farmer=farmer).order_by('-id').values_list(
+        'order_item__order__user__username', flat=True
+    )[:100]
+    customers = list(dict.fromkeys(recent))[:10]
 
     # Notifications for farmer
-    unread_notifications = Notification.objects.filter(user=farmer, is_read=False).count()
-    notifications = Notification.objects.filter(user=farmer).order_by('-created_at')
+    unread_notifications = badges.unread_count(farmer.id)
+    notifications = Notification.objects.filter(user=farmer).order_by('-created_at')[:5]
 
-    # Stock alerts
-    stock_alerts = StockAlert.objects.filter(product__user=farmer)
-    stock_alert_count = stock_alerts.count()
+    # Stock alerts: the precomputed set (home/stock_alerts.py)
+    stock_alerts = list(StockAlert.objects.filter(user=farmer).select_related('product').order_by('-created_at'))
 
     return render(request, 'farmer/dashboard.html', {
         'total_products': total_products,
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'delivered_orders': delivered_orders,
-        'total_earnings': total_earnings,
+        'stats': stats,
+        'total_orders': stats['total_orders'],
+        'pending_orders': stats['pending'],
+        'delivered_orders': stats['delivered_orders'],
+        'total_earnings': ledger.balance(farmer).earned_total,
         'customers': customers,
         'unread_notifications': unread_notifications,
         'notifications': notifications,
-        'stock_alert_count': stock_alert_count,
+        'stock_alert_count': len(stock_alerts),
         'stock_alerts': stock_alerts,
     })
 
@@ -881,53 +875,66 @@ def farmer_dashboardfn(request):
 # -----------------------------
 @login_required
 def farmer_ordersfn(request):
+    # Filters live in the query string; POSTs keep them for the redirect
+    filters = order_queue.parse_filters(request.GET)
     if request.method == 'POST':
-        order_id = request.POST.get('farmer_order_id')  # hidden input in template
-        farmer_order = get_object_or_404(FarmerOrder, id=order_id, farmer=request.user)
-
         new_status = request.POST.get('status')
-        valid_statuses = ['Pending', 'Shipped', 'Delivered', 'Cancelled']
-
-        if new_status in valid_statuses:
-            farmer_order.status = new_status
-            farmer_order.save()
-            messages.success(request, f"Order #{farmer_order.id} status updated to {new_status}.")
+        if request.POST.get('action') == 'bulk':
+            if new_status not in order_queue.BULK_STATUSES:
+                messages.error(request, "Choose a status to apply.")
+            else:
+                if request.POST.get('scope') == 'all':
+                    ids = order_queue.matching_ids(request.user, filters, new_status)
+                else:
+                    ids = [pk for pk in request.POST.getlist('ids') if pk.isdigit()]
+                # One UPDATE and one batch of notifications (home/order_status.py)
+                moved = set_lines_status(request.user, ids, new_status)
+                skipped = len(ids) - len(moved)
+                messages.success(request, f"{len(moved)} order(s) updated to {new_status}.")
+                if skipped:
+                    messages.warning(request, f"{skipped} order(s) could not move to {new_status} and were skipped.")
+            return redirect(request.get_full_path())
 
-            # Update main order status if all farmer orders are delivered
-            main_order = farmer_order.order_item.order
-            all_farmer_orders = FarmerOrder.objects.filter(order_item__order=main_order)
-            if all(f.status == 'Delivered' for f in all_farmer_orders):
-                if main_order.status != 'Delivered':  # avoid duplicate updates
-                    main_order.status = 'Delivered'
-                    main_order.save()
-
-                    # ✅ Notify customer (once only)
-                    if main_order.user and not Notification.objects.filter(
-                        user=main_order.user,
-                        message__contains=f"order #{main_order.id} has been delivered"
-                    ).exists():
-                        Notification.objects.create(
-                            user=main_order.user,
-                            message=f"Your order #{main_order.id} has been delivered!"
-                        )
+        order_id = request.POST.get('farmer_order_id')  # hidden input in template
+        farmer_order = get_object_or_404(
+            FarmerOrder.objects.select_related('order_item'), id=order_id, farmer=request.user
+        )
+        try:
+            # The cancel and its restock commit together or not at all
+            with transaction.atomic():
+                # Updates the parent order's line counters and status too (home/order_status.py)
+                set_line_status(farmer_order, new_status)
+                if new_status == 'Cancelled':
+                    release_reservations(farmer_order.order_item.order_id, [farmer_order.order_item.product_id])
+        except InvalidTransition as e:
+            messages.error(request, f"Order #{farmer_order.id} {e}.")
         else:
-            messages.error(request, "Invalid status selected.")
-
-        return redirect('/farmerorders/')
+            messages.success(request, f"Order #{farmer_order.id} status updated to {new_status}.")
 
-    # GET request: show only the farmer's orders
-    orders = FarmerOrder.objects.filter(farmer=request.user).select_related(
-        'order_item', 'order_item__product', 'order_item__order'
-    ).order_by('-id')
+        return redirect(request.get_full_path())
 
-    return render(request, 'farmer/orders.html', {'orders': orders})
+    # GET request: one page of the farmer's queue (home/order_queue.py)
+    orders = order_queue.page(request.user, filters, request.GET.get('cursor'))
+    return render(request, 'farmer/orders.html', {
+        'orders': orders,
+        'filters': filters,
+        'statuses': order_queue.LINE_STATUSES,
+        'bulk_statuses': order_queue.BULK_STATUSES,
+        'bulk_limit': order_queue.BULK_LIMIT,
+    })
 # -----------------------------
 # Farmer Payments
 # -----------------------------
 @login_required
 def farmer_paymentsfn(request):
-    payments = FarmerPayment.objects.filter(farmer=request.user).order_by('-created_at')
-    return render(request, 'farmer/payments.html', {'payments': payments})
+    payments = FarmerPayment.objects.filter(farmer=request.user)
+    paginator = CursorPaginator(payments, ['-id'], per_page=25)
+    payments = paginator.get_page(request.GET.get('cursor'))
+
+    return render(request, 'farmer/payments.html', {
+        'payments': payments,
+        'balance': ledger.balance(request.user),  # one row (home/ledger.py)
+    })
 
 
 # -----------------------------
@@ -935,9 +942,8 @@ def farmer_paymentsfn(request):
 # -----------------------------
 @login_required
 def farmer_notificationsfn(request):
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-    # Mark all as read
-    notifications.update(is_read=True)
+    # One page per request; the first page moves the read watermark
+    notifications = read_page(request.user, request.GET.get('cursor'))
     return render(request, 'farmer/notifications.html', {'notifications': notifications})
 
 
@@ -946,7 +952,8 @@ def farmer_notificationsfn(request):
 # -----------------------------
 @login_required
 def farmer_stock_alertsfn(request):
-    alerts = StockAlert.objects.filter(user=request.user, is_alerted=False)
+    # The precomputed set of products at or below their threshold (home/stock_alerts.py)
+    alerts = StockAlert.objects.filter(user=request.user).select_related('product').order_by('-created_at')
     return render(request, 'farmer/stock_alerts.html', {'alerts': alerts})
 
 
@@ -958,9 +965,35 @@ def farmer_productsfn(request):
     products = Product.objects.filter(user=request.user)
     return render(request, 'farmer/products.html', {'products': products})
 
+# -----------------------------
+# Farmer bulk product import
+# -----------------------------
+@login_required
+def farmer_importfn(request):
+    if getattr(getattr(request.user, 'userprofile', None), 'role', None) != 'farmer':
+        return HttpResponseForbidden("Only farmers can import products.")
+
+    form = ProductImportUploadForm(request.POST or None, request.FILES or None)
+    if request.method == 'POST' and form.is_valid():
+        # Files go to storage; the 'import_products' job streams them (home/product_import.py)
+        with transaction.atomic():
+            product_import = ProductImport.objects.create(
+                farmer=request.user, csv_file=form.cleaned_data['csv_file'], images=form.cleaned_data['images'],
+            )
+            enqueue('import_products', import_id=product_import.pk)
+        messages.success(request, f"Import #{product_import.pk} queued.")
+        return redirect('/farmerimport/')
+
+    imports = list(ProductImport.objects.filter(farmer=request.user).order_by('-id')[:10])
+    return render(request, 'farmer/import.html', {
+        'form': form,
+        'imports': imports,
+        'active': any(i.status in ('Queued', 'Running') for i in imports),  # refresh the page until done
+    })
+
 @login_required
 def customer_notificationsfn(request):
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
+    notifications = read_page(request.user, request.GET.get('cursor'))
     return render(request, 'customer_notifications.html', {'notifications': notifications})
 
 # Admin dashboard view
@@ -997,8 +1030,13 @@ def update_order_status(request, order_id, status):
     if not hasattr(request.user, 'userprofile') or request.user.userprofile.role != 'admin':
         return HttpResponseForbidden("Not allowed")
     order = get_object_or_404(Order, id=order_id)
-    order.status = status
-    order.save()
+    try:
+        with transaction.atomic():
+            transition_order(order, status)  # moves the order's lines with it
+            if status == 'Cancelled':
+                release_reservations(order.id)
+    except InvalidTransition as e:
+        messages.error(request, f"Order #{order.id}: {e}.")
     return redirect('/admin-dashboard/')
 
 # Block/unblock user
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -64,6 +65,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'home.context_processors.badges',
             ],
         },
     },
@@ -79,10 +81,59 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent checkouts queue up
+            # instead of failing with "database is locked" mid-transaction.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # On disk rather than in memory, so the concurrency tests in
+        # home/tests.py can share it between threads.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 
+# Cache
+# Shared by all gunicorn workers on the host, so catalog cache generations
+# (home/catalog_cache.py) invalidate everywhere at once. The file cache has
+# no atomic add()/incr(); home/catalog_cache.py and home/badges.py do not
+# rely on them. MAX_ENTRIES leaves room for the listings, facets and
+# per-user badges (the default of 300 culls them under normal traffic);
+# every set() lists the directory, so it is not sized much larger.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'ofv_cache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+# Rebuild locks for home/catalog_cache.py: files created atomically, so
+# exactly one worker on the host recomputes a missing listing.
+CATALOG_LOCK_DIR = Path(tempfile.gettempdir()) / 'ofv_cache_locks'
+
+
+# Background jobs (home/jobs.py)
+# False: jobs are stored in the database and run by `manage.py runjobs`.
+# True: jobs run in-process right after the enqueuing transaction commits.
+
+JOBS_EAGER = False
+
+
+# Notification retention (home/retention.py, `manage.py prune_notifications`)
+# Read notifications older than this many days are removed, and each user
+# keeps at most this many notifications once the rest are read.
+
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_MAX_PER_USER = 500
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -75,6 +75,7 @@ urlpatterns = [
     path('farmernotifications/', farmer_notificationsfn),
     path('farmerstock-alerts/', farmer_stock_alertsfn),
     path('farmerproducts/', farmer_productsfn),
+    path('farmerimport/', farmer_importfn),
 
     path('customernotifications/', customer_notificationsfn),
 